@@ -52,3 +52,7 @@ class ParameterAdmin(admin.ModelAdmin):
     list_display = [field.name for field in Parameter._meta.fields]
     inlines = [ProductParameterInline, ]
 
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = [field.name for field in ImportJob._meta.fields]
@@ -0,0 +1,228 @@
+import functools
+import uuid
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from backend.cache import catalog_versions, make_etag, orders_etag
+from backend.models import ProductInfo, Order, OrderItem
+from backend.serializers import OrderValuesSerializer, BasketValuesSerializer
+
+
+@functools.lru_cache(maxsize=None)
+def basket_redis():
+    """
+    Соединение с Redis, в котором хранятся корзины (settings.BASKET_REDIS_URL)
+    """
+    return redis.Redis.from_url(settings.BASKET_REDIS_URL, decode_responses=True)
+
+
+class DatabaseBasket:
+    """
+    Корзина в таблицах заказов: Order со статусом basket и его позиции OrderItem.
+    Цены позиций не хранятся до оформления заказа, как и в RedisBasket: выводятся текущие цены товаров.
+    """
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._order = None
+
+    @property
+    def order(self):
+        if self._order is None:
+            self._order, _ = Order.objects.get_or_create(user_id=self.user_id, status='basket')
+        return self._order
+
+    def orders(self):
+        return Order.objects.filter(user_id=self.user_id, status='basket')
+
+    def etag(self):
+        return orders_etag(self.orders())
+
+    def data(self, context):
+        return OrderValuesSerializer(self.orders(), many=True, context=context).data
+
+    def items(self, product_info_ids):
+        """
+        Позиции корзины с товарами product_info_ids: словарь id товара -> OrderItem
+        """
+        return {order_item.product_info_id: order_item for order_item in OrderItem.objects.filter(
+            order_id=self.order.id, product_info_id__in=product_info_ids)}
+
+    def order_items(self):
+        return OrderItem.objects.filter(order__status='basket', order__user_id=self.user_id).select_related(
+            'product_info__product', 'product_info__shop')
+
+    def save(self, items, product_infos, existing):
+        """
+        Записывает проверенные позиции items (product_info, quantity): новые - одним bulk_create,
+        уже добавленные из existing - одним bulk_update. Возвращает позиции в порядке items.
+        """
+        order_items, created, changed = [], [], []
+        for item in items:
+            order_item = existing.get(item['product_info'])
+            if order_item is None:
+                order_item = OrderItem(order=self.order, product_info_id=item['product_info'])
+                created.append(order_item)
+            else:
+                order_item.updated_at = timezone.now()
+                changed.append(order_item)
+            order_item.quantity = item['quantity']
+            order_items.append(order_item)
+        OrderItem.objects.bulk_create(created)
+        if changed:
+            OrderItem.objects.bulk_update(changed, ['quantity', 'updated_at'])
+        for order_item in order_items:
+            # В ответ выводятся текущие цены, в базе цена позиции не сохраняется
+            order_item.price = product_infos[order_item.product_info_id].price
+            order_item.total_sum = order_item.price * order_item.quantity
+        return order_items
+
+    def remove(self, product_info_ids):
+        OrderItem.objects.filter(order_id=self.order.id, product_info_id__in=product_info_ids).delete()
+
+    def clear(self):
+        OrderItem.objects.filter(order_id=self.order.id).delete()
+
+    def checkout(self):
+        """
+        Заказ со статусом basket для оформления или None, если корзины нет
+        """
+        return self.orders().prefetch_related('ordered_items__product_info__shop').first()
+
+    def discard(self):
+        """
+        Вызывается после оформления заказа: корзиной был сам заказ, удалять нечего
+        """
+
+
+class RedisBasket:
+    """
+    Корзина в хеше Redis: поле - id товара, значение - количество. Цены не хранятся, выводятся текущие
+    цены товаров. В Order/OrderItem корзина записывается только при оформлении заказа (checkout),
+    поэтому брошенные корзины не попадают в таблицы заказов и удаляются Redis через BASKET_TTL
+    после последнего изменения.
+    """
+    def __init__(self, key, user_id=None):
+        self.key = key
+        self.user_id = user_id
+
+    def quantities(self):
+        return {int(product_info_id): int(quantity)
+                for product_info_id, quantity in basket_redis().hgetall(self.key).items()}
+
+    def etag(self):
+        # Цены и остатки товаров выводятся текущие, поэтому ответ зависит и от версии каталога
+        return make_etag(sorted(self.quantities().items()), catalog_versions())
+
+    def data(self, context):
+        return BasketValuesSerializer(self.quantities(), context=context).data
+
+    def items(self, product_info_ids):
+        """
+        Количество товаров product_info_ids, уже добавленных в корзину: словарь id товара -> количество
+        """
+        product_info_ids = list(product_info_ids)
+        quantities = basket_redis().hmget(self.key, product_info_ids) if product_info_ids else []
+        return {product_info_id: int(quantity)
+                for product_info_id, quantity in zip(product_info_ids, quantities) if quantity is not None}
+
+    @staticmethod
+    def order_item(product_info, quantity):
+        """
+        Несохраненная позиция для вывода в формате OrderItemSerializer и в шаблонах
+        """
+        return OrderItem(product_info=product_info, quantity=quantity, price=product_info.price,
+                         total_sum=product_info.price * quantity)
+
+    def order_items(self):
+        quantities = self.quantities()
+        product_infos = ProductInfo.objects.select_related('product', 'shop').in_bulk(quantities)
+        return [self.order_item(product_infos[product_info_id], quantity)
+                for product_info_id, quantity in quantities.items() if product_info_id in product_infos]
+
+    def write(self, quantities):
+        pipeline = basket_redis().pipeline()
+        pipeline.hset(self.key, mapping=quantities)
+        pipeline.expire(self.key, settings.BASKET_TTL)
+        pipeline.execute()
+
+    def save(self, items, product_infos, existing):
+        """
+        Записывает проверенные позиции items (product_info, quantity) одной командой HSET.
+        Возвращает несохраненные позиции в порядке items.
+        """
+        self.write({item['product_info']: item['quantity'] for item in items})
+        return [self.order_item(product_infos[item['product_info']], item['quantity']) for item in items]
+
+    def remove(self, product_info_ids):
+        if product_info_ids:
+            basket_redis().hdel(self.key, *product_info_ids)
+
+    def clear(self):
+        basket_redis().delete(self.key)
+
+    def merge(self, other):
+        """
+        Переносит позиции корзины other в эту корзину (количество из other заменяет прежнее) и удаляет other
+        """
+        quantities = other.quantities()
+        if quantities:
+            self.write(quantities)
+        other.clear()
+
+    def checkout(self):
+        """
+        Записывает корзину в Order со статусом basket и его позиции с текущими ценами товаров.
+        Вызывается в транзакции оформления заказа, чтобы при ошибке заказ не сохранился.
+        Возвращает заказ или None, если корзина пуста.
+        """
+        quantities = self.quantities()
+        product_infos = ProductInfo.objects.in_bulk(quantities)
+        if not product_infos:
+            return None
+        order = Order.objects.create(user_id=self.user_id, status='basket')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_info_id=product_info_id, quantity=quantity,
+                      price=product_infos[product_info_id].price,
+                      total_sum=product_infos[product_info_id].price * quantity)
+            for product_info_id, quantity in quantities.items() if product_info_id in product_infos])
+        return Order.objects.prefetch_related('ordered_items__product_info__shop').get(id=order.id)
+
+    def discard(self):
+        """
+        Удаляет корзину после оформления заказа
+        """
+        self.clear()
+
+
+def user_basket(user_id):
+    return RedisBasket(f'basket:user:{user_id}', user_id)
+
+
+def anonymous_basket(basket_id):
+    return RedisBasket(f'basket:anonymous:{basket_id}')
+
+
+def get_basket(request):
+    """
+    Корзина текущего пользователя в хранилище settings.BASKET_BACKEND ('database' или 'redis').
+    Анонимному пользователю корзина доступна только в Redis: ее идентификатор хранится в сессии
+    и переживает вход в систему (см. merge_anonymous_basket). Для базы данных возвращается None.
+    """
+    if settings.BASKET_BACKEND == 'redis':
+        if request.user.is_authenticated:
+            return user_basket(request.user.id)
+        return anonymous_basket(request.session.setdefault('basket_id', uuid.uuid4().hex))
+    if request.user.is_authenticated:
+        return DatabaseBasket(request.user.id)
+    return None
+
+
+def merge_anonymous_basket(request, user):
+    """
+    Переносит корзину, собранную до входа в систему, в корзину пользователя
+    """
+    basket_id = request.session.pop('basket_id', None)
+    if basket_id and settings.BASKET_BACKEND == 'redis':
+        user_basket(user.id).merge(anonymous_basket(basket_id))
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from rest_framework.response import Response
+
+from backend.models import Category, Parameter
+
+
+class NameCache:
+    """
+    Кеш соответствия имя <-> id справочника (Parameter, Category) в памяти процесса.
+    Заполняется групповыми запросами, новые значения попадают в кеш только после фиксации транзакции,
+    чтобы в нем не оставались id откаченных записей. Сбрасывается сигналами при изменении справочника.
+    Сброс передается другим процессам (gunicorn, Celery) через версию в общем кеше Django:
+    процесс сверяет ее не чаще раза в NAME_CACHE_CHECK_INTERVAL секунд и при расхождении очищает свой кеш.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.ids = {}
+        self.names = {}
+        self.lock = threading.Lock()
+        self.version_key = f'name-cache-version:{model._meta.model_name}'
+        self.version = None
+        self.checked_at = None
+
+    def _check_version(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < settings.NAME_CACHE_CHECK_INTERVAL:
+            return
+        version = cache.get(self.version_key)
+        with self.lock:
+            if version != self.version:
+                self.ids.clear()
+                self.names.clear()
+                self.version = version
+            self.checked_at = now
+
+    def __deepcopy__(self, memo):
+        # Кеш общий для процесса: поля сериализаторов при копировании получают тот же экземпляр
+        return self
+
+    def _remember(self, pairs):
+        def update():
+            with self.lock:
+                for name, object_id in pairs:
+                    self.ids[name] = object_id
+                    self.names[object_id] = name
+        if pairs:
+            transaction.on_commit(update)
+
+    def get_ids(self, names, create=False):
+        """
+        Возвращает словарь имя -> id. При create=True недостающие записи создаются одним запросом.
+        """
+        self._check_version()
+        resolved = {name: self.ids[name] for name in names if name in self.ids}
+        missing = set(names) - resolved.keys()
+        if missing:
+            found = dict(self.model.objects.filter(name__in=missing).values_list('name', 'id'))
+            if create and missing - found.keys():
+                self.model.objects.bulk_create([self.model(name=name) for name in missing - found.keys()],
+                                               ignore_conflicts=True)
+                found.update(self.model.objects.filter(name__in=missing - found.keys()).values_list('name', 'id'))
+            self._remember(list(found.items()))
+            resolved.update(found)
+        return resolved
+
+    def get_name(self, object_id):
+        """
+        Возвращает имя по id. При промахе справочник загружается целиком одним запросом.
+        """
+        self._check_version()
+        name = self.names.get(object_id)
+        if name is None:
+            pairs = list(self.model.objects.values_list('name', 'id'))
+            self._remember(pairs)
+            name = next((name for name, pk in pairs if pk == object_id), None)
+        return name
+
+    def get_names(self, object_ids):
+        """
+        Возвращает словарь id -> имя для набора id
+        """
+        self._check_version()
+        resolved = {object_id: self.names[object_id] for object_id in object_ids if object_id in self.names}
+        missing = set(object_ids) - resolved.keys()
+        if missing:
+            found = dict(self.model.objects.filter(id__in=missing).values_list('id', 'name'))
+            self._remember([(name, object_id) for object_id, name in found.items()])
+            resolved.update(found)
+        return resolved
+
+    def invalidate(self, *args, **kwargs):
+        """
+        Очищает кеш процесса, а после фиксации транзакции меняет общую версию для остальных процессов
+        """
+        with self.lock:
+            self.ids.clear()
+            self.names.clear()
+        def bump():
+            cache.set(self.version_key, time.time_ns(), timeout=None)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(bump)
+        else:
+            bump()
+
+
+parameter_names = NameCache(Parameter)
+category_names = NameCache(Category)
+
+
+def catalog_version_keys(shop_id=None):
+    """
+    Ключи версий, от которых зависит ответ каталога. Список без фильтра по магазину зависит от общей версии,
+    список товаров одного магазина - только от версии этого магазина и версии справочника категорий.
+    """
+    if shop_id:
+        return ['catalog-version:categories', f'catalog-version:shop:{shop_id}']
+    return ['catalog-version']
+
+
+def catalog_versions(shop_id=None):
+    keys = catalog_version_keys(shop_id)
+    versions = cache.get_many(keys)
+    return [versions.get(key, 0) for key in keys]
+
+
+def bump_catalog_version(shop_id=None):
+    """
+    Меняет общую версию каталога и версию магазина (без shop_id - версию справочника категорий).
+    Ответы, закешированные со старой версией, больше не читаются и удаляются по истечении срока хранения.
+    Версия - время в наносекундах, поэтому не повторяется даже после вытеснения ключа из кеша.
+    """
+    version = time.time_ns()
+    keys = ['catalog-version', f'catalog-version:shop:{shop_id}' if shop_id else 'catalog-version:categories']
+    cache.set_many({key: version for key in keys}, timeout=None)
+
+
+def make_etag(*parts):
+    """
+    ETag из значений, от которых зависит ответ
+    """
+    return quote_etag(hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest())
+
+
+def request_etag(request, *parts):
+    """
+    ETag ответа на запрос request: кроме значений parts учитывает параметры запроса (фильтры, ?fields=, ?expand=)
+    и выбранный формат ответа, так как от них зависит тело ответа
+    """
+    return make_etag(sorted(request.query_params.lists()), request.accepted_media_type, *parts)
+
+
+def not_modified(request, etag):
+    """
+    Ответ 304 с заголовком ETag, если клиент прислал тот же ETag в If-None-Match, иначе None
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+    return response
+
+
+def orders_etag(orders):
+    """
+    ETag списка заказов, вычисляемый одним агрегирующим запросом без сериализации заказов.
+    Учитывает время изменения заказов, их позиций и контактов, число позиций
+    и общую версию каталога, так как в заказ выводятся текущие данные товаров.
+    """
+    state = orders.aggregate(orders=Count('id', distinct=True), updated_at=Max('updated_at'),
+                             items=Count('ordered_items', distinct=True),
+                             items_updated_at=Max('ordered_items__updated_at'),
+                             contacts_updated_at=Max('contact__updated_at'))
+    return make_etag(state, catalog_versions())
+
+
+class CachedListMixin:
+    """
+    Кеширование ответа списка каталога (категории, магазины, товары).
+    Ключ строится по адресу запроса, всем параметрам (фильтры, курсор страницы) и версиям каталога,
+    поэтому повторный запрос не обращается к базе данных, пока каталог не изменится.
+    Тот же ключ служит ETag ответа: при совпадении с If-None-Match возвращается 304 без чтения кеша.
+    cache_shop_param - параметр запроса с id магазина, ответ для которого зависит только от версии этого магазина.
+    """
+    cache_shop_param = None
+
+    def list(self, request, *args, **kwargs):
+        shop_id = request.query_params.get(self.cache_shop_param) if self.cache_shop_param else None
+        shop_id = shop_id if shop_id and shop_id.isdigit() else None
+        etag = request_etag(request, request.build_absolute_uri(request.path), catalog_versions(shop_id))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        key = 'catalog:' + etag.strip('"')
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, timeout=settings.CATALOG_CACHE_TIMEOUT)
+        return Response(data, headers={'ETag': etag})
@@ -0,0 +1,107 @@
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Max, Min, Q
+
+from backend.cache import parameter_names
+from backend.models import ProductFacet, ProductParameter
+from backend.utils import chunked
+
+FACET_PARAM = re.compile(r'param\[(.+)\]')
+REFRESH_BATCH_SIZE = 1000
+
+
+class FacetFilterError(ValueError):
+    """
+    Неверное значение фильтра в запросе
+    """
+
+
+def normalize_value(value):
+    return str(value).strip().lower()[:128]
+
+
+def replace_facets(parameters, existing_ids=()):
+    """
+    Записывает фасеты товаров. parameters - словарь id товара -> {id параметра: значение},
+    existing_ids - товары, прежние фасеты которых нужно удалить.
+    """
+    if existing_ids:
+        ProductFacet.objects.filter(product_info_id__in=existing_ids).delete()
+    ProductFacet.objects.bulk_create([
+        ProductFacet(product_info_id=product_info_id, parameter_id=parameter_id, value=normalize_value(value))
+        for product_info_id, values in parameters.items() for parameter_id, value in values.items()])
+
+
+def refresh_facets(product_info_ids=None):
+    """
+    Пересчитывает индекс фасетов товаров по их параметрам. Без product_info_ids пересчитывается весь индекс.
+    """
+    if product_info_ids is None:
+        product_info_ids = ProductParameter.objects.values_list('product_info_id', flat=True).distinct()
+    for ids in chunked(product_info_ids, REFRESH_BATCH_SIZE):
+        parameters = {}
+        for product_info_id, parameter_id, value in ProductParameter.objects.filter(
+                product_info_id__in=ids).values_list('product_info_id', 'parameter_id', 'value'):
+            parameters.setdefault(product_info_id, {})[parameter_id] = value
+        replace_facets(parameters, ids)
+
+
+def parse_facet_filters(query_params):
+    """
+    Разбирает фильтры запроса: param[<имя параметра>]=<значение> (можно повторять для выбора нескольких значений),
+    price_min и price_max. Возвращает словарь имя параметра -> множество значений и границы цены.
+    """
+    parameters = {}
+    for key in query_params:
+        match = FACET_PARAM.fullmatch(key)
+        if match:
+            parameters.setdefault(match.group(1), set()).update(
+                normalize_value(value) for value in query_params.getlist(key))
+    prices = []
+    for key in ('price_min', 'price_max'):
+        try:
+            price = Decimal(query_params[key]) if query_params.get(key) else None
+        except InvalidOperation:
+            price = Decimal('NaN')
+        if price is not None and not price.is_finite():
+            raise FacetFilterError(f'Неверное значение {key}. Ожидается число.')
+        prices.append(price)
+    return parameters, *prices
+
+
+def filter_by_facets(queryset, parameters, price_min=None, price_max=None):
+    """
+    Фильтрует товары по значениям параметров: внутри одного параметра значения объединяются через ИЛИ,
+    разные параметры - через И. Условие на любое число параметров проверяется одним подзапросом
+    к индексу фасетов, без отдельного соединения на каждый параметр.
+    """
+    if price_min is not None:
+        queryset = queryset.filter(price__gte=price_min)
+    if price_max is not None:
+        queryset = queryset.filter(price__lte=price_max)
+    if not parameters:
+        return queryset
+    ids = parameter_names.get_ids(parameters)
+    if len(ids) < len(parameters):
+        return queryset.none()
+    condition = Q()
+    for name, values in parameters.items():
+        condition |= Q(parameter_id=ids[name], value__in=values)
+    matched = ProductFacet.objects.filter(condition).values('product_info_id').annotate(
+        matched=Count('parameter_id', distinct=True)).filter(matched=len(parameters)).values('product_info_id')
+    return queryset.filter(pk__in=matched)
+
+
+def facet_counts(queryset):
+    """
+    Количество товаров queryset по каждому значению каждого параметра и диапазон цен
+    """
+    counts = {}
+    for parameter_id, value, count in ProductFacet.objects.filter(
+            product_info_id__in=queryset.values('pk')).values('parameter_id', 'value').annotate(
+            count=Count('id')).order_by('parameter_id', 'value').values_list('parameter_id', 'value', 'count'):
+        counts.setdefault(parameter_id, {})[value] = count
+    names = parameter_names.get_names(counts)
+    prices = queryset.aggregate(min=Min('price'), max=Max('price'))
+    return {'parameters': {names[parameter_id]: values for parameter_id, values in counts.items()}, 'price': prices}
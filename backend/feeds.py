@@ -0,0 +1,258 @@
+import csv
+import json
+import os
+from contextlib import contextmanager
+
+import yaml
+from yaml.events import AliasEvent, MappingEndEvent, MappingStartEvent, ScalarEvent, SequenceEndEvent, \
+    SequenceStartEvent
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+try:
+    import pyarrow.parquet as parquet
+except ImportError:
+    parquet = None
+
+# Колонки табличного прайса (CSV, Parquet). Остальные колонки считаются параметрами товара.
+TABLE_COLUMNS = ('shop', 'category', 'category_name', 'id', 'model', 'name', 'price', 'price_rrc', 'quantity')
+TABLE_BATCH_SIZE = 1000
+
+
+class PriceImportError(Exception):
+    """
+    Ошибка в содержимом файла с прайсом
+    """
+
+
+class PriceFeed:
+    """
+    Прайс поставщика: название магазина, список категорий и генератор товаров.
+    Товары читаются из файла по одному по мере обхода goods.
+    """
+    def __init__(self, shop, categories, goods):
+        self.shop = shop
+        self.categories = categories
+        self.goods = goods
+
+
+class YamlFeedReader:
+    """
+    Потоковое чтение прайса в формате data/shop_*.yaml.
+    Документ разбирается по событиям парсера (libyaml, если доступен),
+    в памяти одновременно находится только один товар.
+    Разделы могут идти в любом порядке: если goods стоит раньше shop или categories
+    (например, ключи отсортированы yaml.safe_dump), товары при первом проходе пропускаются
+    без разбора, а после чтения заголовка файл читается повторно с начала.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.loader = SafeLoader(stream)
+
+    def read(self):
+        self._start()
+        header, has_goods = {}, False
+        while not self.loader.check_event(MappingEndEvent):
+            key = self._value(self.loader.get_event())
+            if key == 'goods':
+                if 'shop' in header and 'categories' in header:
+                    return PriceFeed(header['shop'], header['categories'], self._goods())
+                has_goods = True
+                self._skip()
+            else:
+                header[key] = self._value(self.loader.get_event())
+        if not has_goods:
+            raise PriceImportError('В файле отсутствует раздел goods')
+        for key in ('shop', 'categories'):
+            if key not in header:
+                raise PriceImportError(f'В файле отсутствует раздел {key}')
+        self.stream.seek(0)
+        self.loader.dispose()
+        self.loader = SafeLoader(self.stream)
+        self._start()
+        while self._value(self.loader.get_event()) != 'goods':
+            self._skip()
+        return PriceFeed(header['shop'], header['categories'], self._goods())
+
+    def _start(self):
+        for event_class in (yaml.StreamStartEvent, yaml.DocumentStartEvent, MappingStartEvent):
+            self._expect(event_class)
+
+    def _skip(self):
+        """
+        Пропускает значение очередного узла, не собирая его
+        """
+        depth = 0
+        while True:
+            event = self.loader.get_event()
+            if isinstance(event, (SequenceStartEvent, MappingStartEvent)):
+                depth += 1
+            elif isinstance(event, (SequenceEndEvent, MappingEndEvent)):
+                depth -= 1
+            if depth == 0:
+                return
+
+    def _goods(self):
+        if not self.loader.check_event(SequenceStartEvent):
+            raise PriceImportError('Раздел goods должен быть списком товаров')
+        self.loader.get_event()
+        while not self.loader.check_event(SequenceEndEvent):
+            yield self._value(self.loader.get_event())
+        self.loader.get_event()
+
+    def _expect(self, event_class):
+        if not self.loader.check_event(event_class):
+            raise PriceImportError('Неверный формат файла прайса')
+        return self.loader.get_event()
+
+    def _value(self, event):
+        return self.loader.construct_document(self._node(event))
+
+    def _node(self, event):
+        """
+        Собирает узел документа из событий парсера, начиная с event
+        """
+        if isinstance(event, ScalarEvent):
+            tag = event.tag if event.tag not in (None, '!') else \
+                self.loader.resolve(ScalarNode, event.value, event.implicit)
+            return ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        if isinstance(event, SequenceStartEvent):
+            tag = event.tag if event.tag not in (None, '!') else \
+                self.loader.resolve(SequenceNode, None, event.implicit)
+            items = []
+            while not self.loader.check_event(SequenceEndEvent):
+                items.append(self._node(self.loader.get_event()))
+            end = self.loader.get_event()
+            return SequenceNode(tag, items, event.start_mark, end.end_mark)
+        if isinstance(event, MappingStartEvent):
+            tag = event.tag if event.tag not in (None, '!') else \
+                self.loader.resolve(MappingNode, None, event.implicit)
+            pairs = []
+            while not self.loader.check_event(MappingEndEvent):
+                key = self._node(self.loader.get_event())
+                pairs.append((key, self._node(self.loader.get_event())))
+            end = self.loader.get_event()
+            return MappingNode(tag, pairs, event.start_mark, end.end_mark)
+        if isinstance(event, AliasEvent):
+            raise PriceImportError('Ссылки (anchors/aliases) в файле прайса не поддерживаются')
+        raise PriceImportError('Неверный формат файла прайса')
+
+
+def read_jsonl_feed(stream):
+    """
+    Чтение прайса в формате JSON Lines.
+    Первая строка - объект с полями shop и categories, каждая следующая строка - один товар.
+    """
+    try:
+        header = json.loads(stream.readline())
+        shop, categories = header['shop'], header['categories']
+    except (ValueError, KeyError, TypeError):
+        raise PriceImportError('Первая строка файла должна содержать поля shop и categories')
+
+    def goods():
+        for number, line in enumerate(stream, start=2):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise PriceImportError(f'Строка {number} не является корректным JSON')
+
+    return PriceFeed(shop, categories, goods())
+
+
+def table_feed(rows, header_rows):
+    """
+    Собирает PriceFeed из строк табличного прайса.
+    header_rows - отдельный проход по колонкам shop, category и category_name для списка категорий,
+    rows - проход по всем строкам для товаров.
+    """
+    shop, categories = None, {}
+    try:
+        for row in header_rows:
+            shop = shop or row['shop']
+            categories.setdefault(int(row['category']), row['category_name'])
+    except KeyError as error:
+        raise PriceImportError(f'В файле отсутствует колонка {error}')
+    except (TypeError, ValueError):
+        raise PriceImportError('Проверьте верность введенных данных в колонке category')
+
+    def goods():
+        for row in rows:
+            item = {column: row.get(column) for column in TABLE_COLUMNS if column not in ('shop', 'category_name')}
+            item['parameters'] = {name: value for name, value in row.items()
+                                  if name not in TABLE_COLUMNS and value not in (None, '')}
+            yield item
+
+    return PriceFeed(shop, [{'id': category_id, 'name': name} for category_id, name in categories.items()], goods())
+
+
+def read_csv_feed(stream):
+    """
+    Чтение прайса в формате CSV: одна строка - один товар, параметры разнесены по колонкам.
+    Разделитель (запятая, точка с запятой или табуляция) определяется по строке заголовка.
+    """
+    try:
+        dialect = csv.Sniffer().sniff(stream.readline(), delimiters=',;\t')
+    except csv.Error:
+        raise PriceImportError('Не удалось определить разделитель колонок CSV')
+
+    def rows():
+        stream.seek(0)
+        yield from csv.DictReader(stream, dialect=dialect)
+
+    return table_feed(rows(), rows())
+
+
+def read_parquet_feed(filename):
+    """
+    Чтение прайса в формате Parquet. Колонки те же, что и у CSV.
+    Требуется установленный pyarrow.
+    """
+    if parquet is None:
+        raise PriceImportError('Для загрузки прайса в формате Parquet требуется пакет pyarrow')
+    try:
+        table = parquet.ParquetFile(filename)
+    except Exception:
+        raise PriceImportError('Неверный формат файла Parquet')
+
+    def rows(columns=None):
+        for batch in table.iter_batches(batch_size=TABLE_BATCH_SIZE, columns=columns):
+            yield from batch.to_pylist()
+
+    header_columns = [column for column in ('shop', 'category', 'category_name') if column in table.schema_arrow.names]
+    return table_feed(rows(), rows(header_columns))
+
+
+FEED_READERS = {
+    '.yaml': lambda stream: YamlFeedReader(stream).read(),
+    '.yml': lambda stream: YamlFeedReader(stream).read(),
+    '.jsonl': read_jsonl_feed,
+    '.ndjson': read_jsonl_feed,
+    '.csv': read_csv_feed,
+}
+
+
+def read_feed(stream, filename):
+    """
+    Возвращает PriceFeed для открытого файла прайса. Формат определяется по расширению файла,
+    по умолчанию используется YAML.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    return FEED_READERS.get(extension, FEED_READERS['.yaml'])(stream)
+
+
+@contextmanager
+def open_feed(filename):
+    """
+    Открывает файл прайса и возвращает PriceFeed. Файл остается открытым, пока читаются товары.
+    """
+    if os.path.splitext(filename)[1].lower() == '.parquet':
+        yield read_parquet_feed(filename)
+        return
+    with open(filename, encoding='utf-8', newline='') as stream:
+        yield read_feed(stream, filename)
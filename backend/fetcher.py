@@ -0,0 +1,89 @@
+import hashlib
+import os
+import tempfile
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+
+from backend.feeds import FEED_READERS
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_TYPES = {
+    'text/csv': '.csv',
+    'application/x-ndjson': '.jsonl',
+    'application/jsonl': '.jsonl',
+    'application/vnd.apache.parquet': '.parquet',
+}
+
+
+class PriceDownload:
+    """
+    Скачанный прайс: путь к файлу и заголовки для следующего условного запроса
+    """
+    def __init__(self, filename, etag, last_modified, content_hash):
+        self.filename = filename
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+
+
+def price_extension(url, content_type):
+    """
+    Расширение файла прайса по адресу или, если его нет в адресе, по Content-Type ответа
+    """
+    extension = os.path.splitext(urlparse(url).path)[1].lower()
+    if extension in FEED_READERS or extension == '.parquet':
+        return extension
+    return CONTENT_TYPES.get((content_type or '').split(';')[0].strip(), '.yaml')
+
+
+def remove_download(filename):
+    """
+    Удаляет файл прайса, если он был скачан fetch_price в PRICE_DOWNLOAD_DIR.
+    Файлы, указанные поставщиком при загрузке вручную, не удаляются.
+    """
+    if not filename:
+        return
+    download_dir = os.path.abspath(settings.PRICE_DOWNLOAD_DIR)
+    if os.path.dirname(os.path.abspath(filename)) == download_dir and os.path.exists(filename):
+        os.remove(filename)
+
+
+def fetch_price(shop):
+    """
+    Скачивает прайс магазина по адресу shop.url.
+    Запрос выполняется с If-None-Match/If-Modified-Since, тело ответа пишется на диск по частям.
+    Возвращает None при ответе 304. Если хеш содержимого совпадает с прошлой загрузкой,
+    файл удаляется и в PriceDownload.filename возвращается None.
+    Каждая загрузка пишется в отдельный файл, поэтому новая загрузка не перезаписывает прайс,
+    который еще не загружен в базу. При ошибке скачивания файл удаляется, остальные файлы
+    удаляет run_import_job: у магазина остается только последний загруженный прайс.
+    """
+    headers = {}
+    if shop.price_etag:
+        headers['If-None-Match'] = shop.price_etag
+    if shop.price_last_modified:
+        headers['If-Modified-Since'] = shop.price_last_modified
+    with requests.get(shop.url, headers=headers, stream=True, timeout=settings.PRICE_FETCH_TIMEOUT) as response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        os.makedirs(settings.PRICE_DOWNLOAD_DIR, exist_ok=True)
+        content_hash = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=settings.PRICE_DOWNLOAD_DIR, delete=False, prefix=f'shop_{shop.id}_',
+                                         suffix=price_extension(shop.url, response.headers.get('Content-Type'))) as fh:
+            try:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    content_hash.update(chunk)
+                    fh.write(chunk)
+            except BaseException:
+                fh.close()
+                os.remove(fh.name)
+                raise
+        download = PriceDownload(fh.name, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                                 content_hash.hexdigest())
+        if download.content_hash == shop.price_hash:
+            os.remove(fh.name)
+            download.filename = None
+        return download
@@ -0,0 +1,318 @@
+from decimal import Decimal, InvalidOperation
+
+import yaml
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.utils import IntegrityError
+from django.utils import timezone
+
+from backend.cache import parameter_names, category_names, bump_catalog_version
+from backend.facets import replace_facets
+from backend.feeds import PriceImportError, open_feed
+from backend.fetcher import remove_download
+from backend.listing import refresh_listings, remove_listings
+from backend.models import Shop, Category, Product, ProductInfo, ProductParameter
+from backend.search import update_search_vectors
+from backend.utils import chunked
+from backend.validation import FeedValidator, PriceValidationError
+from users.models import User
+
+# Поля товара, которые сравниваются при повторной загрузке прайса
+DIFF_FIELDS = ('product_id', 'model', 'price', 'price_rrc', 'quantity', 'parameters')
+
+
+class PriceImporter:
+    """
+    Загрузка прайса поставщика пакетами.
+    Категории, продукты и имена параметров разрешаются несколькими групповыми запросами,
+    а новые записи создаются через bulk_create.
+    """
+    def __init__(self, shop, batch_size=None):
+        self.shop = shop
+        self.batch_size = batch_size or settings.PRICE_IMPORT_BATCH_SIZE
+        self.category_ids = set()
+        self.external_ids = set()
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.retired = 0
+
+    def import_categories(self, categories):
+        """
+        Создает недостающие категории и привязывает их к магазину
+        """
+        names = {}
+        try:
+            for category in categories:
+                names[int(category['id'])] = category['name']
+        except KeyError as error:
+            raise PriceImportError(f'В одном или нескольких значениях списка Категорий отсутствует поле {error}')
+        except (TypeError, ValueError):
+            raise PriceImportError('Проверьте верность введенных данных в пункте Категория')
+        existing = category_names.get_names(names)
+        missing = [category_id for category_id in names if category_id not in existing]
+        if missing:
+            # Категорию могла одновременно создать загрузка другого магазина, поэтому конфликты
+            # пропускаются, а результат сверяется повторным чтением
+            Category.objects.bulk_create([Category(id=category_id, name=names[category_id]) for category_id in missing],
+                                         ignore_conflicts=True)
+            existing.update(Category.objects.filter(id__in=missing).values_list('id', 'name'))
+        if any(existing.get(category_id) != name for category_id, name in names.items()):
+            raise PriceImportError('Проверьте верность введенных данных в пункте Категория')
+        Category.shops.through.objects.bulk_create(
+            [Category.shops.through(category_id=category_id, shop_id=self.shop.id) for category_id in names],
+            ignore_conflicts=True)
+        self.category_ids.update(names)
+
+    def import_goods(self, goods, progress=None):
+        """
+        Загружает товары пакетами по batch_size строк.
+        Товары сопоставляются с уже загруженными по (магазин, внешний ИД):
+        новые создаются, у существующих обновляются только изменившиеся поля и параметры.
+        После каждого пакета вызывает progress с количеством загруженных товаров.
+        Возвращает количество загруженных товаров.
+        Вызывается в транзакции загрузки (run_import_job): ошибка в любом пакете откатывает весь прайс,
+        поэтому отдельные точки сохранения для пакетов не создаются.
+        """
+        for chunk in chunked(goods, self.batch_size):
+            try:
+                self._import_chunk(chunk)
+            except PriceImportError as error:
+                raise PriceImportError(f'{error}. Товары {self.rows + 1}-{self.rows + len(chunk)}')
+            if progress:
+                progress(self.rows)
+        return self.rows
+
+    def retire_missing(self):
+        """
+        Снимает с продажи товары магазина, отсутствующие в загруженном прайсе.
+        Записи не удаляются, чтобы сохранить ссылающиеся на них позиции заказов.
+        """
+        missing = [product_info_id for product_info_id, external_id in ProductInfo.objects.filter(
+            shop_id=self.shop.id, is_active=True).values_list('id', 'external_id')
+                   if external_id not in self.external_ids]
+        for ids in chunked(missing, self.batch_size):
+            ProductInfo.objects.filter(id__in=ids).update(is_active=False, quantity=0)
+        remove_listings(missing)
+        self.retired += len(missing)
+        return len(missing)
+
+    def _import_chunk(self, chunk):
+        try:
+            # Числовые значения YAML (name: 2024) приводятся к строкам, как они хранятся в базе,
+            # иначе неизмененный товар при сравнении считался бы измененным
+            rows = [{
+                'name': str(item['name']),
+                'category_id': int(item['category']),
+                'external_id': int(item['id']),
+                'model': str(item['model']),
+                'price': Decimal(str(item['price'])),
+                'price_rrc': Decimal(str(item['price_rrc'])),
+                'quantity': int(item['quantity']),
+                'parameters': {str(name): str(value) for name, value in (item.get('parameters') or {}).items()},
+            } for item in chunk]
+        except KeyError as error:
+            raise PriceImportError(f'В одном или нескольких значениях списка Товаров отсутствует поле {error}')
+        except (TypeError, ValueError, AttributeError, InvalidOperation):
+            raise PriceImportError('Проверьте верность введенных данных в пункте Товары')
+        self._resolve_categories({row['category_id'] for row in rows} - self.category_ids)
+
+        products = self._resolve_products({(row['name'], row['category_id']) for row in rows})
+        parameters = parameter_names.get_ids({name for row in rows for name in row['parameters']}, create=True)
+        for row in rows:
+            row['product_id'] = products[(row['name'], row['category_id'])]
+            row['parameter_ids'] = {parameters[name]: value for name, value in row['parameters'].items()}
+
+        existing = {product_info.external_id: product_info for product_info in ProductInfo.objects.filter(
+            shop_id=self.shop.id, external_id__in=[row['external_id'] for row in rows])}
+        created, changed, changed_fields, reindex = [], [], set(), set()
+        for row in rows:
+            product_info = existing.get(row['external_id'])
+            if product_info is None:
+                created.append(ProductInfo(shop_id=self.shop.id, external_id=row['external_id'],
+                                           **{field: row[field] for field in DIFF_FIELDS}))
+                continue
+            fields = [field for field in DIFF_FIELDS if getattr(product_info, field) != row[field]]
+            if 'product_id' in fields or 'model' in fields:
+                reindex.add(product_info.id)
+            for field in fields:
+                setattr(product_info, field, row[field])
+            if not product_info.is_active:
+                product_info.is_active = True
+                fields.append('is_active')
+            if fields:
+                changed.append(product_info)
+                changed_fields.update(fields)
+        try:
+            created = ProductInfo.objects.bulk_create(created)
+            if changed:
+                ProductInfo.objects.bulk_update(changed, sorted(changed_fields))
+        except (IntegrityError, TypeError, ValueError):
+            raise PriceImportError('Проверьте верность введенных данных в пункте Товары')
+        product_infos = {product_info.external_id: product_info for product_info in created}
+        product_infos.update(existing)
+        created_ids = {product_info.id for product_info in created}
+        parameters_changed = self._sync_parameters(rows, product_infos, existing) - created_ids
+        # Фасеты новых товаров и товаров с изменившимися параметрами строятся по строкам прайса без чтения из базы
+        refacet = created_ids | parameters_changed
+        replace_facets({product_infos[row['external_id']].id: row['parameter_ids'] for row in rows
+                        if product_infos[row['external_id']].id in refacet}, parameters_changed)
+        update_search_vectors(reindex | refacet)
+        refresh_listings(created_ids | {product_info.id for product_info in changed})
+        self.external_ids.update(row['external_id'] for row in rows)
+        self.inserted += len(created)
+        self.updated += len(changed)
+        self.rows += len(rows)
+
+    @staticmethod
+    def _sync_parameters(rows, product_infos, existing):
+        """
+        Приводит параметры товаров пакета к значениям из прайса, изменяя только отличающиеся записи.
+        Возвращает id товаров, у которых изменились параметры.
+        """
+        current = {}
+        if existing:
+            for product_parameter in ProductParameter.objects.filter(
+                    product_info_id__in=[product_info.id for product_info in existing.values()]):
+                current[(product_parameter.product_info_id, product_parameter.parameter_id)] = product_parameter
+        created, changed = [], []
+        for row in rows:
+            product_info_id = product_infos[row['external_id']].id
+            for parameter_id, value in row['parameter_ids'].items():
+                product_parameter = current.pop((product_info_id, parameter_id), None)
+                if product_parameter is None:
+                    created.append(ProductParameter(product_info_id=product_info_id, parameter_id=parameter_id,
+                                                    value=value))
+                elif product_parameter.value != value:
+                    product_parameter.value = value
+                    changed.append(product_parameter)
+        ProductParameter.objects.bulk_create(created)
+        if changed:
+            ProductParameter.objects.bulk_update(changed, ['value'])
+        if current:
+            ProductParameter.objects.filter(
+                id__in=[product_parameter.id for product_parameter in current.values()]).delete()
+        return {product_parameter.product_info_id for product_parameter in (*created, *changed, *current.values())}
+
+    def _resolve_categories(self, category_ids):
+        """
+        Категории товаров, которых нет в разделе categories прайса, должны уже существовать в базе
+        (так же их проверяет FeedValidator). Найденные категории привязываются к магазину.
+        """
+        if not category_ids:
+            return
+        existing = category_names.get_names(category_ids)
+        unknown = sorted(category_ids - existing.keys())
+        if unknown:
+            raise PriceImportError(f'Неизвестная категория {unknown[0]}')
+        Category.shops.through.objects.bulk_create(
+            [Category.shops.through(category_id=category_id, shop_id=self.shop.id) for category_id in existing],
+            ignore_conflicts=True)
+        self.category_ids.update(existing)
+
+    @staticmethod
+    def _resolve_products(keys):
+        """
+        Возвращает словарь (название, категория) -> id продукта, создавая недостающие продукты
+        """
+        names = {name for name, _ in keys}
+        category_ids = {category_id for _, category_id in keys}
+        resolved = {}
+        for product_id, name, category_id in Product.objects.filter(
+                name__in=names, category_id__in=category_ids).values_list('id', 'name', 'category_id'):
+            resolved.setdefault((name, category_id), product_id)
+        missing = [Product(name=name, category_id=category_id) for name, category_id in keys
+                   if (name, category_id) not in resolved]
+        for product in Product.objects.bulk_create(missing):
+            resolved[(product.name, product.category_id)] = product.id
+        return resolved
+
+
+def prepare_dimensions(categories, names):
+    """
+    Создает категории и имена параметров прайса до транзакции загрузки, отдельными короткими запросами.
+    Загрузки разных магазинов выполняются параллельно в длинных транзакциях: если бы общие записи
+    справочников создавались внутри них, загрузки ждали бы фиксации друг друга.
+    Вызывается только для прайса, прошедшего проверку FeedValidator, который и собирает справочники.
+    """
+    Category.objects.bulk_create([Category(id=category_id, name=name) for category_id, name in categories.items()],
+                                 ignore_conflicts=True)
+    parameter_names.get_ids(names, create=True)
+
+
+def run_import_job(job):
+    """
+    Выполняет загрузку прайса по задаче ImportJob.
+    Перед загрузкой файл целиком проверяется FeedValidator без записи в базу: если найдены ошибки,
+    они сохраняются в job.errors по строкам и загрузка не начинается. По результатам проверки
+    справочники прайса создаются до транзакции загрузки (prepare_dimensions).
+    Загрузка идет в одной транзакции: покупатели видят прежний прайс до ее завершения,
+    а при ошибке все изменения откатываются. Измененные строки ProductInfo остаются заблокированными
+    до конца загрузки, поэтому оформление заказа с этими товарами (списание остатка) ждет ее завершения.
+    Ход выполнения пишется в кеш, так как до фиксации транзакции он не виден другим подключениям к базе.
+    """
+    job.status, job.started_at = 'running', timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    def progress(rows):
+        cache.set(job.progress_key, rows, timeout=settings.PRICE_IMPORT_PROGRESS_TIMEOUT)
+
+    previous = None
+
+    try:
+        validator = FeedValidator()
+        with open_feed(job.filename) as feed:
+            errors = validator.validate(feed)
+        if errors:
+            raise PriceValidationError(errors)
+        prepare_dimensions(validator.categories, validator.parameter_names)
+        with open_feed(job.filename) as feed, transaction.atomic():
+            # Блокировка поставщика не дает двум загрузкам одного магазина выполняться одновременно
+            User.objects.select_for_update().filter(id=job.user_id).first()
+            try:
+                shop, _ = Shop.objects.get_or_create(name=feed.shop, user_id=job.user_id)
+            except (IntegrityError, TypeError):
+                raise PriceImportError('Не указано название магазина или указано неверно')
+            previous = shop.filename.name
+            shop.filename, shop.url, shop.last_update = job.filename, job.url, timezone.now()
+            shop.save()
+            importer = PriceImporter(shop)
+            importer.import_categories(feed.categories)
+            job.rows_processed = importer.import_goods(feed.goods, progress=progress)
+            importer.retire_missing()
+    except PriceValidationError as error:
+        job.status = 'failed'
+        job.errors.extend(error.errors)
+    except (PriceImportError, OSError, UnicodeDecodeError, yaml.YAMLError) as error:
+        job.status = 'failed'
+        job.rows_processed = 0
+        job.errors.append({'row': None, 'id': None, 'field': None, 'error': str(error)})
+    except Exception as error:
+        # Непредвиденная ошибка (например, DatabaseError) не должна оставлять загрузку в статусе running:
+        # задача помечается неуспешной, а исключение передается дальше, чтобы его записал Celery
+        job.status, job.rows_processed, job.finished_at = 'failed', 0, timezone.now()
+        job.errors.append({'row': None, 'id': None, 'field': None, 'error': str(error)})
+        job.save(update_fields=['status', 'rows_processed', 'finished_at', 'errors'])
+        cache.delete(job.progress_key)
+        remove_download(job.filename)
+        raise
+    else:
+        job.status = 'done'
+    job.shop = Shop.objects.filter(user_id=job.user_id).first()
+    if job.status == 'done' and job.price_hash:
+        job.shop.price_etag, job.shop.price_last_modified, job.shop.price_hash = \
+            job.price_etag, job.price_last_modified, job.price_hash
+        job.shop.save(update_fields=['price_etag', 'price_last_modified', 'price_hash'])
+    if job.status == 'done':
+        # Закешированные ответы каталога с товарами магазина больше не используются
+        bump_catalog_version(job.shop.id)
+    # Скачанные прайсы не накапливаются: у магазина остается только файл последней успешной загрузки
+    if job.status != 'done':
+        remove_download(job.filename)
+    elif previous and previous != job.filename:
+        remove_download(previous)
+    job.finished_at = timezone.now()
+    job.save()
+    cache.delete(job.progress_key)
+    return job
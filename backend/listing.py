@@ -0,0 +1,49 @@
+from backend.models import ProductInfo, ProductListing, ProductParameter
+from backend.utils import chunked
+
+LISTING_FIELDS = ('shop_id', 'shop_name', 'category_id', 'category_name', 'name', 'model', 'quantity', 'price',
+                  'price_rrc')
+REFRESH_BATCH_SIZE = 1000
+
+
+def refresh_listings(product_info_ids=None):
+    """
+    Обновляет строки ProductListing для товаров: товары в продаже записываются одним запросом
+    с обновлением при конфликте, снятые с продажи удаляются. Без product_info_ids пересчитывается вся модель.
+    """
+    if product_info_ids is None:
+        ProductListing.objects.exclude(product_info__is_active=True).delete()
+        product_info_ids = list(ProductInfo.objects.filter(is_active=True).values_list('id', flat=True))
+    for ids in chunked(product_info_ids, REFRESH_BATCH_SIZE):
+        listings = [ProductListing(product_info_id=row[0], **dict(zip(LISTING_FIELDS, row[1:])))
+                    for row in ProductInfo.objects.filter(id__in=ids, is_active=True).values_list(
+                        'id', 'shop_id', 'shop__name', 'product__category_id', 'product__category__name',
+                        'product__name', 'model', 'quantity', 'price', 'price_rrc')]
+        ProductListing.objects.bulk_create(listings, update_conflicts=True, unique_fields=['product_info'],
+                                           update_fields=LISTING_FIELDS)
+        if len(listings) < len(ids):
+            remove_listings(set(ids) - {listing.product_info_id for listing in listings})
+
+
+def remove_listings(product_info_ids):
+    """
+    Удаляет из списка товары, снятые с продажи
+    """
+    for ids in chunked(product_info_ids, REFRESH_BATCH_SIZE):
+        ProductListing.objects.filter(product_info_id__in=ids).delete()
+
+
+def refresh_parameters(product_info_ids=None):
+    """
+    Пересчитывает поле parameters товаров по записям ProductParameter.
+    Без product_info_ids пересчитываются все товары.
+    """
+    if product_info_ids is None:
+        product_info_ids = list(ProductInfo.objects.values_list('id', flat=True))
+    for ids in chunked(product_info_ids, REFRESH_BATCH_SIZE):
+        parameters = {product_info_id: {} for product_info_id in ids}
+        for product_info_id, name, value in ProductParameter.objects.filter(product_info_id__in=ids).order_by(
+                'id').values_list('product_info_id', 'parameter__name', 'value'):
+            parameters[product_info_id][name] = value
+        ProductInfo.objects.bulk_update([ProductInfo(id=product_info_id, parameters=values)
+                                         for product_info_id, values in parameters.items()], ['parameters'])
@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+
+import yaml
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from backend.importer import PriceImporter
+from backend.management.commands.benchmark_price_import import generate_price
+from backend.models import Shop, ProductInfo, Order, OrderItem
+from backend.serializers import OrderSerializer, OrderValuesSerializer
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Сравнение OrderSerializer и OrderValuesSerializer на сгенерированных заказах. ' \
+           'Все изменения в базе данных откатываются после замера.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50, help='Количество заказов')
+        parser.add_argument('--items', type=int, default=40, help='Количество позиций в заказе')
+        parser.add_argument('--repeat', type=int, default=3, help='Количество повторов замера')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create(email='benchmark-orders-shop@example.com', type='shop')
+            shop = Shop.objects.create(name='Бенчмарк', user=user)
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'price.yaml')
+                generate_price(path, options['items'] * 2)
+                with open(path, encoding='utf-8') as fh:
+                    read_data = yaml.load(fh, Loader=yaml.SafeLoader)
+            importer = PriceImporter(shop)
+            importer.import_categories(read_data['categories'])
+            importer.import_goods(read_data['goods'])
+            product_infos = list(ProductInfo.objects.filter(shop=shop)[:options['items']])
+
+            buyer = User.objects.create(email='benchmark-orders-buyer@example.com', type='buyer')
+            orders = Order.objects.bulk_create([Order(user=buyer, status='placed')
+                                                for _ in range(options['orders'])])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_info=product_info, quantity=1, price=product_info.price,
+                          total_sum=product_info.price)
+                for order in orders for product_info in product_infos])
+            queryset = Order.objects.filter(user=buyer)
+            for order in queryset:
+                order.update_total()
+
+            results = {}
+            for name, serialize in (
+                    ('OrderSerializer', lambda: OrderSerializer(queryset.prefetch_related(
+                        'ordered_items__product_info__product'), many=True).data),
+                    ('OrderValuesSerializer', lambda: OrderValuesSerializer(queryset, many=True).data)):
+                serialize()
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    data = serialize()
+                results[name] = ((time.perf_counter() - started) / options['repeat'], data)
+                self.stdout.write(f'{name:>22}: {results[name][0]:8.3f} c')
+            if results['OrderSerializer'][1] != results['OrderValuesSerializer'][1]:
+                raise CommandError('Ответы сериализаторов различаются')
+            self.stdout.write(f'Ответы совпадают, ускорение: '
+                              f'x{results["OrderSerializer"][0] / results["OrderValuesSerializer"][0]:.1f}')
+            transaction.set_rollback(True)
@@ -0,0 +1,209 @@
+import csv
+import inspect
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+import yaml
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+
+from backend import signals
+
+from backend.feeds import TABLE_COLUMNS, open_feed
+from backend.importer import PriceImporter
+from backend.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+from users.models import User
+
+PARAMETER_NAMES = ['Диагональ (дюйм)', 'Разрешение (пикс)', 'Встроенная память (Гб)', 'Цвет', 'Вес (г)', 'Гарантия (мес)']
+COLORS = ['черный', 'белый', 'красный', 'синий', 'золотистый']
+
+
+def generate_price(path, goods_count, categories_count=10, seed=0):
+    """
+    Генерирует файл прайса в формате data/shop_*.yaml
+    """
+    rnd = random.Random(seed)
+    categories = [{'id': 900000 + index, 'name': f'Бенчмарк категория {index}'} for index in range(categories_count)]
+    goods = []
+    for index in range(goods_count):
+        price = rnd.randint(100, 300000)
+        goods.append({
+            'id': 1000000 + index,
+            'category': rnd.choice(categories)['id'],
+            'model': f'bench/model-{index % 500}',
+            'name': f'Товар {index % (goods_count // 3 + 1)}',
+            'price': price,
+            'price_rrc': price + rnd.randint(0, 5000),
+            'quantity': rnd.randint(0, 100),
+            'parameters': {
+                'Диагональ (дюйм)': rnd.choice([5.5, 6.1, 6.5]),
+                'Разрешение (пикс)': rnd.choice(['1792x828', '2688x1242']),
+                'Встроенная память (Гб)': rnd.choice([64, 128, 256, 512]),
+                'Цвет': rnd.choice(COLORS),
+                **{name: rnd.randint(1, 1000) for name in PARAMETER_NAMES[4:]},
+            },
+        })
+    with open(path, 'w', encoding='utf-8') as fh:
+        yaml.safe_dump({'shop': 'Бенчмарк', 'categories': categories, 'goods': goods}, fh, allow_unicode=True)
+
+
+def export_price(read_data, path):
+    """
+    Сохраняет прайс в формате JSON Lines или CSV (по расширению path)
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as fh:
+        if path.endswith('.jsonl'):
+            fh.write(json.dumps({'shop': read_data['shop'], 'categories': read_data['categories']},
+                                ensure_ascii=False) + '\n')
+            for item in read_data['goods']:
+                fh.write(json.dumps(item, ensure_ascii=False) + '\n')
+            return
+        names = {category['id']: category['name'] for category in read_data['categories']}
+        parameters = sorted({name for item in read_data['goods'] for name in item['parameters']})
+        writer = csv.DictWriter(fh, fieldnames=[*TABLE_COLUMNS, *parameters])
+        writer.writeheader()
+        for item in read_data['goods']:
+            writer.writerow({'shop': read_data['shop'], 'category_name': names[item['category']],
+                             **{column: item[column] for column in TABLE_COLUMNS if column in item},
+                             **item['parameters']})
+
+
+@contextmanager
+def model_signals_disconnected():
+    """
+    Временно отключает обработчики сохранения моделей из backend.signals (поисковый вектор, список товаров,
+    фасеты, версия каталога). Их не было, когда построчная загрузка выполнялась в PartnerUpdate,
+    а пакетная загрузка их не вызывает, поэтому с ними сравнение показывало бы не то ускорение.
+    """
+    receivers = [receiver for _, receiver in inspect.getmembers(signals, inspect.isfunction)
+                 if receiver.__module__ == signals.__name__]
+    senders = (Shop, Category, Product, ProductInfo, Parameter, ProductParameter)
+    disconnected = [(signal, receiver, sender) for signal in (post_save, post_delete)
+                    for receiver in receivers for sender in senders
+                    if signal.disconnect(receiver, sender=sender)]
+    try:
+        yield
+    finally:
+        for signal, receiver, sender in disconnected:
+            signal.connect(receiver, sender=sender)
+
+
+def row_by_row_import(shop, read_data):
+    """
+    Построчная загрузка прайса в том виде, в котором она выполнялась в PartnerUpdate до пакетной загрузки,
+    без обработчиков сигналов, появившихся позже (см. model_signals_disconnected)
+    """
+    with model_signals_disconnected():
+        _row_by_row_import(shop, read_data)
+
+
+def _row_by_row_import(shop, read_data):
+    for category in read_data['categories']:
+        category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
+        category_object.shops.add(shop.id)
+        category_object.save()
+    ProductInfo.objects.filter(shop=shop.id).delete()
+    for item in read_data['goods']:
+        product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
+        product_info = ProductInfo.objects.create(product_id=product.id,
+                                                  external_id=item['id'],
+                                                  model=item['model'],
+                                                  price=item['price'],
+                                                  price_rrc=item['price_rrc'],
+                                                  quantity=item['quantity'],
+                                                  shop_id=shop.id)
+        for name, value in item['parameters'].items():
+            parameter_object, _ = Parameter.objects.get_or_create(name=name)
+            ProductParameter.objects.create(product_info_id=product_info.id,
+                                            parameter_id=parameter_object.id,
+                                            value=str(value))
+
+
+class QueryCounter:
+    """
+    Подсчет выполненных запросов без сохранения их текста
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def bulk_import(shop, read_data):
+    importer = PriceImporter(shop)
+    importer.import_categories(read_data['categories'])
+    importer.import_goods(read_data['goods'])
+    importer.retire_missing()
+
+
+def changed_price(read_data, share, seed=1):
+    """
+    Копия прайса, в которой у доли share товаров изменены цена и количество
+    """
+    rnd = random.Random(seed)
+    goods = [dict(item) for item in read_data['goods']]
+    for item in rnd.sample(goods, int(len(goods) * share)):
+        item['price'] += 1
+        item['quantity'] = rnd.randint(0, 100)
+    return {**read_data, 'goods': goods}
+
+
+class Command(BaseCommand):
+    help = 'Сравнение построчной и пакетной загрузки прайса на сгенерированном файле. ' \
+           'Все изменения в базе данных откатываются после замера.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goods', type=int, default=5000, help='Количество товаров в прайсе')
+        parser.add_argument('--categories', type=int, default=10, help='Количество категорий в прайсе')
+        parser.add_argument('--changed', type=float, default=0.02,
+                            help='Доля товаров, измененных при повторной загрузке прайса')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'price.yaml')
+            generate_price(path, options['goods'], options['categories'])
+            with open(path, encoding='utf-8') as fh:
+                read_data = yaml.load(fh, Loader=yaml.SafeLoader)
+            for extension in ('jsonl', 'csv'):
+                export_price(read_data, os.path.join(tmp, f'price.{extension}'))
+            for extension in ('yaml', 'jsonl', 'csv'):
+                started = time.perf_counter()
+                with open_feed(os.path.join(tmp, f'price.{extension}')) as feed:
+                    for _ in feed.goods:
+                        pass
+                self.stdout.write(f'Чтение {extension:>5}: {time.perf_counter() - started:8.2f} c')
+
+        results = {}
+        for name, method in (('row-by-row', row_by_row_import), ('bulk', bulk_import)):
+            with transaction.atomic():
+                user = User.objects.create(email=f'benchmark-{name}@example.com', type='shop')
+                shop = Shop.objects.create(name='Бенчмарк', user=user)
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    method(shop, read_data)
+                    elapsed = time.perf_counter() - started
+                results[name] = elapsed
+                self.stdout.write(f'{name:>10}: {elapsed:8.2f} c, запросов: {counter.count}')
+                transaction.set_rollback(True)
+        self.stdout.write(f'Ускорение: x{results["row-by-row"] / results["bulk"]:.1f}')
+
+        with transaction.atomic():
+            user = User.objects.create(email='benchmark-reimport@example.com', type='shop')
+            shop = Shop.objects.create(name='Бенчмарк', user=user)
+            bulk_import(shop, read_data)
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                bulk_import(shop, changed_price(read_data, options['changed']))
+                elapsed = time.perf_counter() - started
+            self.stdout.write(f'Повторная загрузка ({options["changed"]:.0%} изменений): {elapsed:8.2f} c, '
+                              f'запросов: {counter.count}')
+            transaction.set_rollback(True)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.facets import refresh_facets
+from backend.models import ProductFacet
+
+
+class Command(BaseCommand):
+    help = 'Пересчет индекса фасетов по параметрам всех товаров (например, после обновления с версии без фасетов)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refresh_facets()
+        self.stdout.write(f'Записей в индексе фасетов: {ProductFacet.objects.count()}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.listing import refresh_listings
+from backend.models import ProductListing
+
+
+class Command(BaseCommand):
+    help = 'Пересчет модели чтения списка товаров (например, после обновления с версии без ProductListing)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refresh_listings()
+        self.stdout.write(f'Товаров в списке: {ProductListing.objects.count()}')
@@ -0,0 +1,27 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from backend.models import Order, OrderItem, ProductInfo
+
+
+class Command(BaseCommand):
+    help = 'Заполнение цен позиций и сумм заказов (например, после обновления с версии без них). ' \
+           'Позициям оформленных заказов без цены присваивается текущая цена товара, ' \
+           'у позиций корзин цена очищается, так как в корзине выводятся текущие цены'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            OrderItem.objects.filter(order__status='basket').update(price=None, total_sum=0)
+            placed = OrderItem.objects.exclude(order__status='basket')
+            placed.filter(price__isnull=True).update(
+                price=Subquery(ProductInfo.objects.filter(id=OuterRef('product_info_id')).values('price')[:1]))
+            placed.update(total_sum=F('price') * F('quantity'))
+            totals = OrderItem.objects.filter(order_id=OuterRef('id')).values('order_id').annotate(
+                total=Sum('total_sum')).values('total')
+            updated = Order.objects.exclude(status='basket').update(total_sum=Coalesce(
+                Subquery(totals), Value(Decimal(0)), output_field=DecimalField(max_digits=12, decimal_places=2)))
+        self.stdout.write(f'Обновлено заказов: {updated}')
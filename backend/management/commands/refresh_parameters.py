@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.listing import refresh_parameters
+from backend.models import ProductInfo
+
+
+class Command(BaseCommand):
+    help = 'Заполнение поля parameters всех товаров по таблице параметров (например, после обновления с версии без него)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refresh_parameters()
+        self.stdout.write(f'Обновлено товаров: {ProductInfo.objects.count()}')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from backend.cache import bump_catalog_version
+from backend.models import ProductInfo
+from backend.search import refresh_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Пересчет поисковых векторов всех товаров (например, после обновления с версии без полнотекстового поиска)'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refresh_search_vectors()
+        # Закешированные ответы поиска больше не используются
+        bump_catalog_version()
+        self.stdout.write(f'Обновлено товаров: {ProductInfo.objects.count()}')
@@ -1,7 +1,10 @@
 from decimal import Decimal
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 from users.models import User, Contact
 
 # STATE_CHOICES = (
@@ -29,7 +32,12 @@ STATE_ORDERITEM_CHOICES = (
     ('delivered', 'Доставлен'),
 )
 
-
+STATE_IMPORT_CHOICES = (
+    ('pending', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершена'),
+    ('failed', 'Ошибка'),
+)
 
 USER_TYPE_CHOICES = (
     ('shop', 'Магазин'),
@@ -43,6 +51,9 @@ class Shop(models.Model):
     filename = models.FileField(verbose_name='Файл с прайсом', blank=True,
                                 upload_to=None)
     last_update = models.DateTimeField(verbose_name='Последнее обновление прайса', null=True, blank=True)
+    price_etag = models.CharField(max_length=255, verbose_name='ETag прайса', blank=True)
+    price_last_modified = models.CharField(max_length=64, verbose_name='Last-Modified прайса', blank=True)
+    price_hash = models.CharField(max_length=64, verbose_name='Хеш содержимого прайса', blank=True)
     user = models.OneToOneField(User, verbose_name='Поставщик', on_delete=models.CASCADE)
 
     class Meta:
@@ -72,6 +83,10 @@ class Product(models.Model):
     class Meta:
         verbose_name = 'Продукт'
         verbose_name_plural = "Список продуктов"
+        indexes = [
+            # Поиск продукта по названию и категории при загрузке прайса
+            models.Index(fields=['name', 'category'], name='product_name_category'),
+        ]
 
     def __str__(self):
         return self.name
@@ -95,16 +110,27 @@ class ProductInfo(models.Model):
         verbose_name='Рекомендуемая розничная цена',
         validators=[MinValueValidator(Decimal('0.01'))]
     )
+    is_active = models.BooleanField(verbose_name='В продаже', default=True)
+    # Имя параметра -> значение для чтения; фильтрация идет по ProductParameter и ProductFacet
+    parameters = models.JSONField(verbose_name='Параметры', default=dict, blank=True, editable=False)
+    # Заполняется загрузкой прайса (backend.search.update_search_vectors)
+    search_vector = SearchVectorField(verbose_name='Поисковый вектор', null=True, editable=False)
 
     class Meta:
         verbose_name = 'Информация о продукте'
         verbose_name_plural = "Информативный список о продуктах"
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'external_id'], name='unique_shop_external_id'),
+        ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='productinfo_search_vector'),
+        ]
 
     def __str__(self):
         return self.model
 
 class Parameter(models.Model):
-    name = models.CharField(max_length=128, verbose_name='Название параметра')
+    name = models.CharField(max_length=128, verbose_name='Название параметра', unique=True)
 
     def __str__(self):
         return self.name
@@ -126,22 +152,91 @@ class ProductParameter(models.Model):
         verbose_name_plural = "Список параметров"
 
 
+class ProductFacet(models.Model):
+    """
+    Индекс фасетов: нормализованные значения параметров товара для фильтрации и подсчета.
+    Пересчитывается загрузкой прайса (backend.facets.refresh_facets).
+    """
+    product_info = models.ForeignKey(ProductInfo, on_delete=models.CASCADE, verbose_name='Информация о продукте',
+                                     related_name='facets')
+    parameter = models.ForeignKey(Parameter, on_delete=models.CASCADE, verbose_name='Параметр',
+                                  related_name='facets')
+    value = models.CharField(max_length=128, verbose_name='Значение параметра')
+
+    class Meta:
+        verbose_name = 'Фасет товара'
+        verbose_name_plural = "Индекс фасетов товаров"
+        constraints = [
+            models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_info_facet'),
+        ]
+        indexes = [
+            models.Index(fields=['parameter', 'value', 'product_info'], name='facet_parameter_value'),
+        ]
+
+
+class ProductListing(models.Model):
+    """
+    Модель чтения для списка товаров: строка товара в продаже с уже соединенными полями продукта,
+    категории и магазина. Обновляется загрузкой прайса и изменением товаров (backend.listing).
+    """
+    product_info = models.OneToOneField(ProductInfo, on_delete=models.CASCADE, primary_key=True,
+                                        verbose_name='Информация о продукте', related_name='listing')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, verbose_name='Магазин', related_name='listings')
+    shop_name = models.CharField(max_length=128, verbose_name='Название магазина')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name='Категория',
+                                 related_name='listings')
+    category_name = models.CharField(max_length=128, verbose_name='Название категории')
+    name = models.CharField(max_length=128, verbose_name='Название продукта')
+    model = models.CharField(max_length=128, verbose_name='Модель продукта')
+    quantity = models.PositiveIntegerField(verbose_name='Количество продукта')
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена')
+    price_rrc = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Рекомендуемая розничная цена')
+
+    class Meta:
+        verbose_name = 'Строка списка товаров'
+        verbose_name_plural = "Список товаров для просмотра"
+        indexes = [
+            models.Index(fields=['shop', 'product_info'], name='listing_shop'),
+            models.Index(fields=['category', 'product_info'], name='listing_category'),
+        ]
+
+
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь', related_name='users')
     dt = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=128, choices=STATE_ORDER_CHOICES, verbose_name='Статус заказа', default='basket')
     contact = models.ForeignKey(Contact, on_delete=models.CASCADE, verbose_name='Контакты', related_name='contact', null=True, blank=True)
+    updated_at = models.DateTimeField(verbose_name='Дата изменения', auto_now=True)
+    total_sum = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='Сумма заказа', default=0)
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказов"
+        indexes = [
+            # Заказы покупателя по статусу
+            models.Index(fields=['user', 'status'], name='order_user_status'),
+        ]
+
+    def update_total(self, refresh_prices=False):
+        """
+        Пересчитывает сумму заказа по суммам позиций. При refresh_prices цены позиций
+        предварительно заменяются текущими ценами товаров (фиксация цен при оформлении заказа).
+        """
+        if refresh_prices:
+            order_items = list(self.ordered_items.select_related('product_info'))
+            for order_item in order_items:
+                order_item.price = order_item.product_info.price
+                order_item.total_sum = order_item.price * order_item.quantity
+            OrderItem.objects.bulk_update(order_items, ['price', 'total_sum'])
+        self.total_sum = self.ordered_items.aggregate(total=models.Sum('total_sum'))['total'] or 0
+        Order.objects.filter(id=self.id).update(total_sum=self.total_sum, updated_at=timezone.now())
 
     def quantity_and_status_update(self):
         for order_items in self.ordered_items.all():
             product_info = order_items.product_info
             product_info.quantity -= order_items.quantity
-            product_info.save()
+            product_info.save(update_fields=['quantity'])
             order_items.status = 'new'
-            order_items.save()
+            order_items.save(update_fields=['status', 'updated_at'])
     def status_check(self):
         status = [order_items.status for order_items in self.ordered_items.all()]
         if status.count('delivered') == len(status):
@@ -153,9 +248,57 @@ class OrderItem(models.Model):
     product_info = models.ForeignKey(ProductInfo, on_delete=models.CASCADE, verbose_name='Продукт', related_name='ordered_items')
     quantity = models.PositiveIntegerField(verbose_name='Количество')
     status = models.CharField(max_length=128, choices=STATE_ORDERITEM_CHOICES, verbose_name='Статус отправления товара', blank=True)
+    updated_at = models.DateTimeField(verbose_name='Дата изменения', auto_now=True)
+    # Цена товара, фиксируется при оформлении заказа (Order.update_total). У позиций корзины не заполнена:
+    # до оформления выводится текущая цена товара
+    price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена', null=True, blank=True)
+    total_sum = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='Сумма позиции', default=0)
     class Meta:
         verbose_name = 'Заказанная позиция'
         verbose_name_plural = "Список заказанных позиций"
         constraints = [
             models.UniqueConstraint(fields=['order_id', 'product_info'], name='unique_order'),
         ]
+
+    def save(self, *args, **kwargs):
+        if self.price is not None:
+            self.total_sum = self.price * self.quantity
+        if kwargs.get('update_fields') is not None and 'quantity' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'price', 'total_sum'}
+        super().save(*args, **kwargs)
+
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Поставщик', related_name='import_jobs')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, verbose_name='Магазин', related_name='import_jobs',
+                             null=True, blank=True)
+    filename = models.CharField(max_length=255, verbose_name='Файл с прайсом')
+    url = models.URLField(verbose_name='Ссылка магазина', null=True, blank=True)
+    status = models.CharField(max_length=128, choices=STATE_IMPORT_CHOICES, verbose_name='Статус загрузки',
+                              default='pending')
+    rows_processed = models.PositiveIntegerField(verbose_name='Обработано товаров', default=0)
+    errors = models.JSONField(verbose_name='Ошибки загрузки', default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(verbose_name='Начало загрузки', null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name='Окончание загрузки', null=True, blank=True)
+    price_etag = models.CharField(max_length=255, verbose_name='ETag скачанного прайса', blank=True)
+    price_last_modified = models.CharField(max_length=64, verbose_name='Last-Modified скачанного прайса', blank=True)
+    price_hash = models.CharField(max_length=64, verbose_name='Хеш скачанного прайса', blank=True)
+
+    class Meta:
+        verbose_name = 'Загрузка прайса'
+        verbose_name_plural = "Список загрузок прайса"
+
+    @property
+    def progress_key(self):
+        return f'import-job-progress:{self.id}'
+
+    @property
+    def elapsed(self):
+        """
+        Время выполнения загрузки в секундах
+        """
+        if not self.started_at:
+            return None
+        finished_at = self.finished_at or timezone.now()
+        return (finished_at - self.started_at).total_seconds()
@@ -0,0 +1,29 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CatalogCursorPagination(CursorPagination):
+    """
+    Постраничный вывод по курсору (keyset): следующая страница выбирается условием pk > последнего pk
+    по первичному ключу, а не через OFFSET, поэтому дальние страницы обходятся так же дешево, как первая.
+    """
+    ordering = 'pk'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class OrdersCursorPagination(CatalogCursorPagination):
+    """
+    Постраничный вывод заказов по курсору, новые заказы первыми
+    """
+    ordering = '-pk'
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Постраничный вывод результатов поиска. Результаты упорядочены по релевантности,
+    у которой нет уникального ключа для курсора, поэтому страницы выбираются по номеру.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
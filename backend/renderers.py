@@ -0,0 +1,52 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Даты передаются кодировщику, чтобы их формат совпадал со стандартной сериализацией
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(data, encoder=DjangoJSONEncoder):
+    """
+    Сериализует data в JSON (bytes). С установленным orjson - через него, а типы, которые orjson
+    не поддерживает (Decimal, даты, ленивые строки), преобразует метод default кодировщика encoder.
+    Без orjson используется стандартный json с тем же кодировщиком.
+    """
+    if orjson is None:
+        return json.dumps(data, cls=encoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return orjson.dumps(data, default=encoder().default, option=ORJSON_OPTIONS)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson. Ответы с отступами (параметр indent в Accept) и окружение без orjson
+    обрабатываются стандартным JSONRenderer.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data, self.encoder_class)
+
+
+class JsonResponse(HttpResponse):
+    """
+    django.http.JsonResponse с сериализацией через dumps. При переданных json_dumps_params
+    используется стандартный json, так как orjson их не поддерживает.
+    """
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, json_dumps_params=None, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        if json_dumps_params:
+            content = json.dumps(data, cls=encoder, **json_dumps_params)
+        else:
+            content = dumps(data, encoder)
+        super().__init__(content=content, **kwargs)
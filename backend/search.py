@@ -0,0 +1,122 @@
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery
+
+from backend.models import Product, ProductInfo, ProductParameter
+from backend.utils import chunked
+
+# Веса полей в ранжировании: название продукта, модель, значения параметров (как веса A, B, C в Postgres)
+NAME_WEIGHT = 1.0
+MODEL_WEIGHT = 0.4
+PARAMETER_WEIGHT = 0.2
+REFRESH_BATCH_SIZE = 1000
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector():
+    """
+    Выражение поискового вектора товара: название продукта, модель и значения параметров
+    """
+    name = Subquery(Product.objects.filter(id=OuterRef('product_id')).values('name')[:1])
+    parameters = Subquery(ProductParameter.objects.filter(product_info_id=OuterRef('id')).values(
+        'product_info_id').annotate(text=StringAgg('value', delimiter=' ')).values('text')[:1])
+    config = settings.SEARCH_CONFIG
+    return SearchVector(name, weight='A', config=config) + SearchVector('model', weight='B', config=config) + \
+        SearchVector(parameters, weight='C', config=config)
+
+
+def update_search_vectors(product_info_ids):
+    """
+    Пересчитывает поисковый вектор товаров одним запросом. Вызывается загрузкой прайса для каждого пакета.
+    Без Postgres сбрасывается индекс в памяти процесса.
+    """
+    if not product_info_ids:
+        return
+    if uses_postgres():
+        ProductInfo.objects.filter(id__in=product_info_ids).update(search_vector=search_vector())
+    else:
+        product_index.invalidate()
+
+
+def refresh_search_vectors():
+    """
+    Пересчитывает поисковые векторы всех товаров пакетами по REFRESH_BATCH_SIZE
+    """
+    for ids in chunked(list(ProductInfo.objects.values_list('id', flat=True)), REFRESH_BATCH_SIZE):
+        update_search_vectors(ids)
+
+
+def tokenize(text):
+    return re.findall(r'\w+', str(text).lower())
+
+
+class ProductSearchIndex:
+    """
+    Инвертированный индекс товаров в памяти процесса для баз данных без полнотекстового поиска (SQLite в тестах).
+    Строится при первом поиске, сбрасывается при изменении товаров.
+    Как и websearch_to_tsquery, требует совпадения всех слов запроса, но без приведения слов к основе.
+    """
+    def __init__(self):
+        self.postings = None
+        self.lock = threading.Lock()
+
+    def build(self):
+        postings = defaultdict(lambda: defaultdict(float))
+
+        def add(product_info_id, text, weight):
+            for token in tokenize(text):
+                postings[token][product_info_id] += weight
+
+        for product_info_id, name, model in ProductInfo.objects.values_list('id', 'product__name', 'model'):
+            add(product_info_id, name, NAME_WEIGHT)
+            add(product_info_id, model, MODEL_WEIGHT)
+        for product_info_id, value in ProductParameter.objects.values_list('product_info_id', 'value'):
+            add(product_info_id, value, PARAMETER_WEIGHT)
+        return postings
+
+    def search(self, text):
+        """
+        Возвращает список (id товара, релевантность), отсортированный по убыванию релевантности
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+        with self.lock:
+            if self.postings is None:
+                self.postings = self.build()
+            postings = [self.postings.get(token, {}) for token in tokens]
+        ids = set(postings[0]).intersection(*postings[1:])
+        ranks = {product_info_id: sum(posting[product_info_id] for posting in postings) for product_info_id in ids}
+        return sorted(ranks.items(), key=lambda item: (-item[1], item[0]))
+
+    def invalidate(self, *args, **kwargs):
+        with self.lock:
+            self.postings = None
+
+
+product_index = ProductSearchIndex()
+
+
+def search_products(text, queryset):
+    """
+    Полнотекстовый поиск среди товаров queryset (ProductInfo или ProductListing).
+    Возвращает последовательность (id товара, релевантность) по убыванию релевантности:
+    в Postgres - запрос к GIN-индексу поискового вектора, иначе - список из индекса в памяти.
+    """
+    if uses_postgres():
+        query = SearchQuery(text, config=settings.SEARCH_CONFIG, search_type='websearch')
+        return ProductInfo.objects.filter(search_vector=query, id__in=queryset.values('pk')).annotate(
+            rank=SearchRank(F('search_vector'), query)).order_by('-rank', 'id').values_list('id', 'rank')
+    ranked = product_index.search(text)
+    allowed = set(queryset.filter(pk__in=[product_info_id for product_info_id, _ in ranked]).values_list(
+        'pk', flat=True))
+    return [(product_info_id, rank) for product_info_id, rank in ranked if product_info_id in allowed]
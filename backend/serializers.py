@@ -1,14 +1,90 @@
 from decimal import Decimal
 
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from backend.models import Category, Shop, Product, ProductInfo, ProductParameter, Order, OrderItem, \
+from backend.cache import category_names, parameter_names
+from backend.models import Category, Shop, Product, ProductInfo, ProductParameter, Order, OrderItem, ImportJob, \
     STATE_ORDERITEM_CHOICES
 from users.serializers import ContactSerializer
 
-class ShopSerializer(serializers.ModelSerializer):
+class CachedNameField(serializers.Field):
+    """
+    Название записи справочника по ее id из кеша имен, без запроса к связанной таблице
+    """
+    def __init__(self, names, **kwargs):
+        self.names = names
+        super().__init__(read_only=True, **kwargs)
+
+    def to_representation(self, value):
+        return self.names.get_name(value)
+
+
+class ParameterListField(serializers.Field):
+    """
+    Параметры товара из поля ProductInfo.parameters в формате ProductParameterSerializer,
+    без запросов к таблицам параметров
+    """
+    def __init__(self, **kwargs):
+        super().__init__(read_only=True, **kwargs)
+
+    def to_representation(self, value):
+        return [{'parameter': name, 'value': parameter_value} for name, parameter_value in value.items()]
+
+
+def sparse_fields(value):
+    """
+    Разбирает список полей из параметра запроса (?fields=id,price,product.name) в словарь
+    поле -> словарь вложенных полей. Пустой словарь означает все поля.
+    """
+    fields = {}
+    for path in (value or '').split(','):
+        node = fields
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return fields
+
+
+def request_fields(context):
+    """
+    Поля (?fields=) и раскрываемые связи (?expand=) из запроса в контексте сериализатора
+    """
+    request = context.get('request')
+    if request is None:
+        return {}, {}
+    return sparse_fields(request.query_params.get('fields')), sparse_fields(request.query_params.get('expand'))
+
+
+def includes(fields, name):
+    return not fields or name in fields
+
+
+class SparseFieldsMixin:
+    """
+    Выбор полей ответа параметрами запроса ?fields= и ?expand=.
+    fields - выводимые поля через запятую, поля вложенных объектов указываются через точку
+    (ordered_items.quantity); без fields выводятся все поля.
+    expand - связи из Meta.expandable, которые выводятся вложенным объектом вместо id (product_info, shop).
+    Вложенные сериализаторы получают свою часть fields и expand от родителя.
+    """
+    def get_fields(self):
+        fields = super().get_fields()
+        only, expand = getattr(self, 'sparse', None) or request_fields(self.context)
+        for name, serializer_class in getattr(self.Meta, 'expandable', {}).items():
+            if name in expand and name in fields:
+                fields[name] = serializer_class(read_only=True)
+        if only:
+            fields = type(fields)((name, field) for name, field in fields.items() if name in only)
+        for name, field in fields.items():
+            child = getattr(field, 'child', field)
+            if isinstance(child, SparseFieldsMixin):
+                child.sparse = (only.get(name, {}), expand.get(name, {}))
+        return fields
+
+
+class ShopSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Shop
         fields = ['id', 'name', 'url']
@@ -22,8 +98,8 @@ class CategoriesSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class ProductSerializer(serializers.ModelSerializer):
-    category = serializers.StringRelatedField()
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category = CachedNameField(category_names, source='category_id')
 
     class Meta:
         model = Product
@@ -31,21 +107,32 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 class ProductParameterSerializer(serializers.ModelSerializer):
-    parameter = serializers.StringRelatedField()
+    parameter = CachedNameField(parameter_names, source='parameter_id')
 
     class Meta:
         model = ProductParameter
         fields = ['parameter', 'value']
 
 
-class ProductInfoSerializer(serializers.ModelSerializer):
+class ProductInfoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
-    product_parameters = ProductParameterSerializer(read_only=True, many=True)
+    product_parameters = ParameterListField(source='parameters')
 
     class Meta:
         model = ProductInfo
         fields = ['id', 'model', 'product', 'shop', 'quantity', 'price', 'price_rrc', 'product_parameters']
         read_only_fields = ('id',)
+        expandable = {'shop': ShopSerializer}
+
+    @staticmethod
+    def related_fields(fields, expand, prefix=''):
+        """
+        Связи для select_related, которые нужны для вывода полей fields и раскрытых связей expand
+        """
+        related = ['product'] if includes(fields, 'product') else []
+        if 'shop' in expand and includes(fields, 'shop'):
+            related.append('shop')
+        return [prefix + name for name in related]
 
 
 class ProductInfoListSerializer(serializers.ModelSerializer):
@@ -57,6 +144,25 @@ class ProductInfoListSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class ProductListingSerializer(serializers.BaseSerializer):
+    """
+    Строка списка товаров из ProductListing. Поля уже соединены в модели чтения,
+    поэтому ответ собирается напрямую, без вложенных сериализаторов и обращений к связанным таблицам.
+    Формат ответа совпадает с ProductInfoListSerializer.
+    """
+    price_field = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+    def to_representation(self, instance):
+        return {
+            'id': instance.product_info_id,
+            'product': {'name': instance.name, 'category': instance.category_name},
+            'shop': instance.shop_id,
+            'quantity': instance.quantity,
+            'price': self.price_field.to_representation(instance.price),
+            'price_rrc': self.price_field.to_representation(instance.price_rrc),
+        }
+
+
 # class OrderItemSerializer(serializers.ModelSerializer):
 #     order_items_id = serializers.IntegerField(source='id')
 #     quantity = serializers.IntegerField(min_value=1)
@@ -68,19 +174,27 @@ class ProductInfoListSerializer(serializers.ModelSerializer):
 #         fields = ['order_items_id', 'order', 'status', 'product_info', 'quantity', 'total_sum']
 #         read_only_fields = ('order_items_id', 'order')
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     quantity = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = OrderItem
-        fields = ['id', 'order', 'product_info', 'quantity']
-        read_only_fields = ('id',)
+        fields = ['id', 'order', 'product_info', 'quantity', 'price', 'total_sum']
+        read_only_fields = ('id', 'price', 'total_sum')
+        expandable = {'product_info': ProductInfoSerializer}
 
     def update(self, instance, validated_data):
         instance.quantity = validated_data.get("quantity", instance.quantity)
         instance.save()
         return instance
 
+    def to_representation(self, instance):
+        if instance.price is None:
+            # Позиция корзины: цена фиксируется при оформлении заказа, до этого выводится текущая цена товара
+            instance.price = instance.product_info.price
+            instance.total_sum = instance.price * instance.quantity
+        return super().to_representation(instance)
+
     def validate_quantity(self, value):
         data = self.initial_data
         try:
@@ -94,6 +208,62 @@ class OrderItemSerializer(serializers.ModelSerializer):
 
 
 
+class BasketItemListSerializer(serializers.ListSerializer):
+    """
+    Проверка и запись пакета позиций корзины: товары и уже добавленные в корзину позиции
+    выбираются одним запросом каждые, запись выполняет хранилище корзины одной операцией на пакет.
+    При context['update'] количество уже добавленных позиций меняется.
+    Корзина (backend.basket) передается в context['basket'].
+    """
+    def to_internal_value(self, data):
+        product_info_ids = set()
+        for item in data if isinstance(data, list) else ():
+            try:
+                product_info_ids.add(int(item['product_info']))
+            except (KeyError, TypeError, ValueError):
+                continue
+        self.product_infos = ProductInfo.objects.in_bulk(product_info_ids)
+        self.order_items = self.context['basket'].items(product_info_ids)
+        self.seen = set()
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        return self.context['basket'].save(validated_data, self.product_infos, self.order_items)
+
+
+class BasketItemSerializer(serializers.Serializer):
+    """
+    Позиция, добавляемая в корзину или изменяемая в ней. Используется с many=True, проверки выполняются
+    по товарам и позициям, выбранным BasketItemListSerializer, без запросов на каждую позицию.
+    """
+    product_info = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        list_serializer_class = BasketItemListSerializer
+
+    def validate(self, attrs):
+        product_info = self.parent.product_infos.get(attrs['product_info'])
+        if product_info is None:
+            message = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+            raise serializers.ValidationError({'product_info': message.format(pk_value=attrs['product_info'])})
+        if attrs['quantity'] > product_info.quantity:
+            raise serializers.ValidationError({'quantity': {'value_error': f'Вы не можете выбрать больше, чем имеется '
+                                                                          f'у поставщика. Максимальное значение: '
+                                                                          f'{product_info.quantity}'}})
+        if self.context.get('update'):
+            if product_info.id in self.parent.seen:
+                raise serializers.ValidationError('Товар указан в запросе несколько раз')
+        elif product_info.id in self.parent.seen or product_info.id in self.parent.order_items:
+            # Повтор товара в одном запросе проверяется так же, как уже добавленный в корзину
+            raise serializers.ValidationError('Товар уже добавлен в корзину')
+        self.parent.seen.add(product_info.id)
+        return attrs
+
+    def to_representation(self, instance):
+        return OrderItemSerializer(instance).data
+
+
 class OrderListSerializer(serializers.ModelSerializer):
     contact = ContactSerializer(read_only=True)
 
@@ -107,10 +277,10 @@ class OrderItemCreateSerializer(OrderItemSerializer):
     product_info = ProductInfoSerializer(read_only=True)
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
-    total_sum = serializers.IntegerField()
+    total_sum = serializers.IntegerField(read_only=True)
     contact = ContactSerializer(read_only=True)
 
     class Meta:
@@ -118,6 +288,164 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ('id', 'status', 'dt', 'ordered_items',  'total_sum', 'contact')
         read_only_fields = ('id',)
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.status == 'basket' and 'total_sum' in data:
+            data['total_sum'] = int(sum(order_item.product_info.price * order_item.quantity
+                                        for order_item in instance.ordered_items.all()))
+        return data
+
+
+CONTACT_FIELDS = ('first_name', 'last_name', 'surname', 'region', 'area', 'city', 'street', 'house', 'structure',
+                  'building', 'apartment', 'phone')
+ORDER_VALUES = ('id', 'status', 'dt', 'total_sum')
+ORDER_CONTACT_VALUES = ('contact_id', 'contact__user_id', 'contact__user__type',
+                        *(f'contact__{field}' for field in CONTACT_FIELDS))
+ORDER_ITEM_VALUES = ('id', 'order_id', 'quantity', 'price', 'total_sum', 'product_info_id')
+ORDER_ITEM_PRODUCT_VALUES = ('product_info__model', 'product_info__product__name',
+                             'product_info__product__category_id', 'product_info__shop_id', 'product_info__quantity',
+                             'product_info__price', 'product_info__price_rrc', 'product_info__parameters')
+
+
+def add_category_names(rows):
+    """
+    Добавляет в строки позиций названия категорий товаров из кеша имен
+    """
+    categories = category_names.get_names({row['product_info__product__category_id'] for row in rows})
+    for row in rows:
+        row['product_info__product__category'] = categories.get(row['product_info__product__category_id'])
+
+
+def select_fields(builders, fields, row):
+    """
+    Собирает словарь ответа из функций builders (поле -> функция от строки и вложенных полей)
+    только для полей, вошедших в fields
+    """
+    return {name: build(row, fields.get(name, {})) for name, build in builders.items() if includes(fields, name)}
+
+
+class OrderValuesListSerializer(serializers.ListSerializer):
+    """
+    Выбирает заказы вместе с контактами и их позиции с товарами двумя запросами .values(),
+    названия категорий - из кеша имен, и передает строки заказов в OrderValuesSerializer.
+    Столбцы и запросы для полей, не вошедших в ?fields=, не выполняются.
+    """
+    def to_representation(self, data):
+        only = request_fields(self.context)[0]
+        with_contact = includes(only, 'contact')
+        with_items = includes(only, 'ordered_items')
+        with_products = with_items and includes(only.get('ordered_items', {}), 'product_info')
+        orders = list(data.values(*ORDER_VALUES, *(ORDER_CONTACT_VALUES if with_contact else ())))
+        # Цены позиций корзины не фиксируются до оформления: выводятся текущие цены товаров и сумма по ним
+        baskets = {order['id'] for order in orders if order['status'] == 'basket'}
+        with_basket_items = bool(baskets) and (with_items or includes(only, 'total_sum'))
+        ordered_items = {}
+        if with_items or with_basket_items:
+            order_ids = [order['id'] for order in orders] if with_items else list(baskets)
+            product_values = ORDER_ITEM_PRODUCT_VALUES if with_products else ('product_info__price',) if baskets else ()
+            for row in OrderItem.objects.filter(order_id__in=order_ids).order_by('id').values(*ORDER_ITEM_VALUES,
+                                                                                              *product_values):
+                if row['order_id'] in baskets:
+                    row['price'] = row['product_info__price']
+                    row['total_sum'] = row['price'] * row['quantity']
+                ordered_items.setdefault(row['order_id'], []).append(row)
+        if with_products:
+            add_category_names([row for rows in ordered_items.values() for row in rows])
+        for order in orders:
+            order['ordered_items'] = ordered_items.get(order['id'], [])
+            if order['id'] in baskets:
+                order['total_sum'] = sum(row['total_sum'] for row in order['ordered_items'])
+        return [select_fields(self.child.builders, only, order) for order in orders]
+
+
+def format_field(field):
+    return lambda value: field.to_representation(value) if value is not None else None
+
+
+format_dt = format_field(serializers.DateTimeField())
+format_price = format_field(serializers.DecimalField(max_digits=10, decimal_places=2))
+format_total = format_field(serializers.DecimalField(max_digits=12, decimal_places=2))
+
+PRODUCT_INFO_BUILDERS = {
+    'id': lambda row, only: row['product_info_id'],
+    'model': lambda row, only: row['product_info__model'],
+    'product': lambda row, only: select_fields({
+        'name': lambda row, only: row['product_info__product__name'],
+        'category': lambda row, only: row['product_info__product__category'],
+    }, only, row),
+    'shop': lambda row, only: row['product_info__shop_id'],
+    'quantity': lambda row, only: row['product_info__quantity'],
+    'price': lambda row, only: format_price(row['product_info__price']),
+    'price_rrc': lambda row, only: format_price(row['product_info__price_rrc']),
+    'product_parameters': lambda row, only: [{'parameter': name, 'value': value}
+                                             for name, value in row['product_info__parameters'].items()],
+}
+ORDER_ITEM_BUILDERS = {
+    'id': lambda row, only: row['id'],
+    'order': lambda row, only: row['order_id'],
+    'product_info': lambda row, only: select_fields(PRODUCT_INFO_BUILDERS, only, row),
+    'quantity': lambda row, only: row['quantity'],
+    'price': lambda row, only: format_price(row['price']),
+    'total_sum': lambda row, only: format_total(row['total_sum']),
+}
+CONTACT_BUILDERS = {
+    'id': lambda row, only: row['contact_id'],
+    'user': lambda row, only: row['contact__user_id'],
+    **{field: lambda row, only, field=field: row[f'contact__{field}'] for field in CONTACT_FIELDS[:3]},
+    'type': lambda row, only: row['contact__user__type'],
+    **{field: lambda row, only, field=field: row[f'contact__{field}'] for field in CONTACT_FIELDS[3:]},
+}
+
+
+class OrderValuesSerializer(serializers.BaseSerializer):
+    """
+    Вывод списка заказов только для чтения в формате OrderSerializer, без вложенных ModelSerializer:
+    ответ собирается из строк .values() заранее составленными функциями полей.
+    Используется с many=True на queryset заказов, поддерживает ?fields= в формате SparseFieldsMixin.
+    """
+    builders = {
+        'id': lambda row, only: row['id'],
+        'status': lambda row, only: row['status'],
+        'dt': lambda row, only: format_dt(row['dt']),
+        'ordered_items': lambda row, only: [select_fields(ORDER_ITEM_BUILDERS, only, item)
+                                            for item in row['ordered_items']],
+        'total_sum': lambda row, only: int(row['total_sum']),
+        'contact': lambda row, only: select_fields(CONTACT_BUILDERS, only, row)
+        if row['contact_id'] is not None else None,
+    }
+
+    class Meta:
+        list_serializer_class = OrderValuesListSerializer
+
+    def to_representation(self, order):
+        return select_fields(self.builders, {}, order)
+
+
+class BasketValuesSerializer(serializers.BaseSerializer):
+    """
+    Вывод корзины, хранящейся вне таблиц заказов (словарь id товара -> количество), в формате
+    OrderValuesSerializer: список из одного заказа со статусом basket без id и даты, цены позиций -
+    текущие цены товаров. Товары выбираются одним запросом .values(), поддерживается ?fields=.
+    """
+    def to_representation(self, quantities):
+        if not quantities:
+            return []
+        only = request_fields(self.context)[0]
+        product_values = [value.removeprefix('product_info__') for value in ORDER_ITEM_PRODUCT_VALUES]
+        ordered_items = []
+        for row in ProductInfo.objects.filter(id__in=quantities).order_by('id').values('id', *product_values):
+            quantity = quantities[row['id']]
+            ordered_items.append({
+                **{f'product_info__{value}': row[value] for value in product_values},
+                'id': None, 'order_id': None, 'product_info_id': row['id'], 'quantity': quantity,
+                'price': row['price'], 'total_sum': row['price'] * quantity,
+            })
+        if includes(only, 'ordered_items') and includes(only.get('ordered_items', {}), 'product_info'):
+            add_category_names(ordered_items)
+        order = {'id': None, 'status': 'basket', 'dt': None, 'contact_id': None, 'ordered_items': ordered_items,
+                 'total_sum': sum(row['total_sum'] for row in ordered_items)}
+        return [select_fields(OrderValuesSerializer.builders, only, order)]
+
 
 class StatusSerializer(serializers.ModelSerializer):
     status = serializers.ChoiceField(choices=STATE_ORDERITEM_CHOICES)
@@ -131,3 +459,19 @@ class StatusSerializer(serializers.ModelSerializer):
         instance.status = validated_data.get("status", instance.quantity)
         instance.save()
         return instance
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    elapsed = serializers.FloatField(read_only=True)
+    rows_processed = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'shop', 'status', 'rows_processed', 'errors', 'elapsed', 'created_at', 'started_at',
+                  'finished_at')
+        read_only_fields = fields
+
+    def get_rows_processed(self, obj):
+        if obj.status == 'running':
+            return cache.get(obj.progress_key, obj.rows_processed)
+        return obj.rows_processed
@@ -0,0 +1,116 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from backend.basket import merge_anonymous_basket
+from backend.cache import parameter_names, category_names, bump_catalog_version
+from backend.models import Parameter, Category, Shop, Product, ProductInfo, ProductParameter, ProductListing
+from backend.facets import refresh_facets
+from backend.listing import refresh_listings, refresh_parameters
+from backend.search import update_search_vectors
+
+
+@receiver([post_save, post_delete], sender=Parameter)
+def invalidate_parameter_names(sender, **kwargs):
+    """
+    Сброс кеша имен параметров при их изменении
+    """
+    parameter_names.invalidate()
+
+
+@receiver(post_save, sender=Parameter)
+def rename_product_parameters(sender, instance, **kwargs):
+    """
+    Обновление имени параметра в поле parameters товаров
+    """
+    refresh_parameters(list(instance.product_parameters.values_list('product_info_id', flat=True)))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_names(sender, **kwargs):
+    """
+    Сброс кеша имен категорий и закешированного каталога при их изменении
+    """
+    category_names.invalidate()
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog(sender, **kwargs):
+    """
+    Сброс всего закешированного каталога при изменении продукта
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Shop)
+def invalidate_shop_catalog(sender, instance, **kwargs):
+    """
+    Сброс закешированного каталога при изменении магазина
+    """
+    transaction.on_commit(lambda: bump_catalog_version(instance.id))
+
+
+@receiver([post_save, post_delete], sender=ProductInfo)
+def invalidate_product_catalog(sender, instance, **kwargs):
+    """
+    Сброс закешированного каталога магазина при изменении товара (например, остатка при оформлении заказа).
+    Пакетная загрузка прайса сигналы не вызывает и меняет версию сама.
+    """
+    transaction.on_commit(lambda: bump_catalog_version(instance.shop_id))
+
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, **kwargs):
+    """
+    Пересчет поисковых векторов и строк списка товаров при изменении продукта
+    """
+    product_info_ids = list(instance.product_info.values_list('id', flat=True))
+    update_search_vectors(product_info_ids)
+    refresh_listings(product_info_ids)
+
+
+@receiver(post_save, sender=ProductInfo)
+def reindex_product_info(sender, instance, **kwargs):
+    """
+    Пересчет поискового вектора и строки списка товаров при изменении товара, в том числе остатка при заказе
+    """
+    update_search_vectors([instance.id])
+    refresh_listings([instance.id])
+
+
+@receiver(post_save, sender=Shop)
+def rename_shop_listings(sender, instance, **kwargs):
+    """
+    Обновление названия магазина в строках списка товаров
+    """
+    ProductListing.objects.filter(shop_id=instance.id).exclude(shop_name=instance.name).update(shop_name=instance.name)
+
+
+@receiver(post_save, sender=Category)
+def rename_category_listings(sender, instance, **kwargs):
+    """
+    Обновление названия категории в строках списка товаров
+    """
+    ProductListing.objects.filter(category_id=instance.id).exclude(category_name=instance.name).update(
+        category_name=instance.name)
+
+
+@receiver([post_save, post_delete], sender=ProductParameter)
+def reindex_product_parameter(sender, instance, **kwargs):
+    """
+    Пересчет поискового вектора, фасетов и поля parameters товара при изменении его параметров
+    """
+    refresh_parameters([instance.product_info_id])
+    refresh_facets([instance.product_info_id])
+    update_search_vectors([instance.product_info_id])
+
+
+@receiver(user_logged_in)
+def merge_basket_on_login(sender, request, user, **kwargs):
+    """
+    Перенос корзины, собранной до входа в систему, в корзину пользователя
+    """
+    if request is not None and hasattr(request, 'session'):
+        merge_anonymous_basket(request, user)
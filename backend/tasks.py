@@ -1,9 +1,18 @@
-from celery import shared_task
+import logging
+
+from celery import shared_task, group, chord
 
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
+
+import requests
+
+from backend.fetcher import fetch_price
+from backend.importer import run_import_job
+from backend.models import Order, OrderItem, ImportJob, Shop
 
-from backend.models import Order, OrderItem
+logger = logging.getLogger(__name__)
 
 
 @shared_task
@@ -78,4 +87,73 @@ def send_order_partner_task(email, order_id):
         # to:
         [email]
     )
-    msg.send()
\ No newline at end of file
+    msg.send()
+
+
+@shared_task
+def import_price_task(job_id):
+    """
+    Загрузка прайса поставщика в фоне
+    """
+    job = ImportJob.objects.get(id=job_id)
+    run_import_job(job)
+    return job.status
+
+
+@shared_task
+def schedule_price_imports_task(job_ids):
+    """
+    Запуск загрузок прайсов разных магазинов параллельно на воркерах Celery.
+    Общие справочники (категории, параметры) каждая загрузка создает после проверки прайса,
+    вне своей транзакции (см. run_import_job), поэтому загрузки не ждут друг друга.
+    """
+    job_ids = [job_id for job_id in job_ids if job_id]
+    if not job_ids:
+        return []
+    group(import_price_task.s(job_id) for job_id in job_ids).apply_async()
+    return job_ids
+
+
+@shared_task
+def fetch_price_task(shop_id):
+    """
+    Скачивание прайса магазина по ссылке.
+    Возвращает номер созданной загрузки или None, если прайс не изменился или не скачался.
+    Ошибка скачивания записывается в журнал и в загрузку со статусом failed. Задача не завершается
+    исключением: иначе в chord (fetch_price_lists_task) не загрузились бы прайсы и остальных магазинов.
+    """
+    shop = Shop.objects.filter(id=shop_id).first()
+    if shop is None:
+        logger.warning('Магазин %s для скачивания прайса не найден', shop_id)
+        return None
+    try:
+        download = fetch_price(shop)
+    except Exception as error:
+        if isinstance(error, requests.RequestException):
+            logger.warning('Не удалось скачать прайс магазина %s (%s): %s', shop.id, shop.url, error)
+        else:
+            logger.exception('Ошибка при скачивании прайса магазина %s (%s)', shop.id, shop.url)
+        ImportJob.objects.create(user_id=shop.user_id, url=shop.url, status='failed', finished_at=timezone.now(),
+                                 errors=[{'row': None, 'id': None, 'field': 'url', 'error': str(error)}])
+        return None
+    if download is None:
+        return None
+    if not download.filename:
+        shop.price_etag, shop.price_last_modified = download.etag or '', download.last_modified or ''
+        shop.save(update_fields=['price_etag', 'price_last_modified'])
+        return None
+    job = ImportJob.objects.create(user_id=shop.user_id, filename=download.filename, url=shop.url,
+                                   price_etag=download.etag or '', price_last_modified=download.last_modified or '',
+                                   price_hash=download.content_hash)
+    return job.id
+
+
+@shared_task
+def fetch_price_lists_task():
+    """
+    Периодическая проверка прайсов всех магазинов, у которых указана ссылка.
+    Прайсы скачиваются параллельно, изменившиеся загружаются одной группой.
+    """
+    shop_ids = Shop.objects.exclude(url__isnull=True).exclude(url='').values_list('id', flat=True)
+    if shop_ids:
+        chord(fetch_price_task.s(shop_id) for shop_id in shop_ids)(schedule_price_imports_task.s())
@@ -1,11 +1,14 @@
 from django.urls import path
 
 from backend.views import CategoryView, ShopView, ProductView, PartnerUpdate, BasketView, OrderView, PartnerOrders, \
-    PartnerState, PartnerOrdersList, ProductViewRetrieve
+    PartnerState, PartnerOrdersList, ProductViewRetrieve, PartnerUpdateStatus, \
+    PartnerUpdateReport, ProductSearchView
 
 app_name = 'backend'
 urlpatterns = [
     path('partner/update/', PartnerUpdate.as_view(), name='partner-update'),
+    path('partner/update/<int:job_id>', PartnerUpdateStatus.as_view(), name='partner-update-status'),
+    path('partner/update/<int:job_id>/report', PartnerUpdateReport.as_view(), name='partner-update-report'),
     path('partner/status/<int:order_items_id>', PartnerState.as_view(), name='partner-state'), #изменение статуса заказа
     path('partner/orders/', PartnerOrdersList.as_view(), name='partner-orders_list'),
     path('partner/orders/<int:order_id>', PartnerOrders.as_view(), name='partner-orders'),
@@ -13,6 +16,7 @@ urlpatterns = [
     path('shops/', ShopView.as_view(), name='shops'),
     path('products/<int:product_id>', ProductViewRetrieve.as_view(), name='products'),
     path('products/', ProductView.as_view(), name='products'),
+    path('products/search/', ProductSearchView.as_view(), name='products-search'),
     path('basket/', BasketView.as_view(), name='basket'),
     path('order/', OrderView.as_view(), name='order'),
 
@@ -0,0 +1,154 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+
+from backend.cache import category_names
+from backend.feeds import PriceImportError
+
+REQUIRED_FIELDS = ('id', 'category', 'model', 'name', 'price', 'price_rrc', 'quantity')
+MAX_INTEGER = 2147483647
+MAX_LENGTH = 128
+MIN_PRICE = Decimal('0.01')
+MAX_PRICE = Decimal('99999999.99')
+
+
+class PriceValidationError(PriceImportError):
+    """
+    Прайс не прошел проверку. errors - список ошибок по строкам товаров
+    """
+    def __init__(self, errors):
+        super().__init__(f'Найдено ошибок в прайсе: {len(errors)}')
+        self.errors = errors
+
+
+def to_integer(value):
+    """
+    Целое неотрицательное число из значения прайса или None
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        number = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return number if 0 <= number <= MAX_INTEGER else None
+
+
+def to_price(value):
+    """
+    Цена из значения прайса или None
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        price = Decimal(str(value).strip())
+    except (TypeError, InvalidOperation):
+        return None
+    return price if price.is_finite() else None
+
+
+class FeedValidator:
+    """
+    Проверка прайса до записи в базу данных.
+    Собирает все ошибки по строкам товаров, а не останавливается на первой.
+    """
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors or settings.PRICE_IMPORT_MAX_ERRORS
+        self.errors = []
+        # Справочники прайса (категории раздела categories и имена параметров товаров) для prepare_dimensions
+        self.categories = {}
+        self.parameter_names = set()
+
+    @property
+    def is_full(self):
+        return len(self.errors) >= self.max_errors
+
+    def add(self, message, row=None, external_id=None, field=None):
+        if not self.is_full:
+            self.errors.append({'row': row, 'id': external_id, 'field': field, 'error': message})
+
+    def validate(self, feed):
+        """
+        Возвращает список ошибок прайса. Пустой список - прайс можно загружать.
+        """
+        if not isinstance(feed.shop, str) or not feed.shop.strip():
+            self.add('Не указано название магазина или указано неверно', field='shop')
+        elif len(feed.shop) > MAX_LENGTH:
+            self.add(f'Длина названия магазина не должна превышать {MAX_LENGTH} символов', field='shop')
+        categories = self.categories = self._validate_categories(feed.categories)
+        seen, unknown = set(), {}
+        for row, item in enumerate(feed.goods, start=1):
+            if self.is_full:
+                break
+            if not isinstance(item, dict):
+                self.add('Товар должен содержать поля ' + ', '.join(REQUIRED_FIELDS), row=row)
+                continue
+            external_id = to_integer(item.get('id'))
+            for field in REQUIRED_FIELDS:
+                if item.get(field) in (None, ''):
+                    self.add('Отсутствует обязательное поле', row, item.get('id'), field)
+            if item.get('id') not in (None, ''):
+                if external_id is None:
+                    self.add('Внешний ИД должен быть целым неотрицательным числом', row, item.get('id'), 'id')
+                elif external_id in seen:
+                    self.add('Товар с таким внешним ИД уже встречался в прайсе', row, external_id, 'id')
+                else:
+                    seen.add(external_id)
+            if item.get('category') not in (None, ''):
+                category_id = to_integer(item['category'])
+                if category_id is None:
+                    self.add('Категория должна быть целым числом', row, external_id, 'category')
+                elif category_id not in categories:
+                    unknown.setdefault(category_id, []).append((row, external_id))
+            for field in ('price', 'price_rrc'):
+                if item.get(field) not in (None, ''):
+                    price = to_price(item[field])
+                    if price is None or not MIN_PRICE <= price <= MAX_PRICE:
+                        self.add(f'Цена должна быть числом от {MIN_PRICE} до {MAX_PRICE}', row, external_id, field)
+            if item.get('quantity') not in (None, '') and to_integer(item['quantity']) is None:
+                self.add('Количество должно быть целым неотрицательным числом', row, external_id, 'quantity')
+            for field in ('name', 'model'):
+                if len(str(item.get(field) or '')) > MAX_LENGTH:
+                    self.add(f'Длина поля не должна превышать {MAX_LENGTH} символов', row, external_id, field)
+            parameters = item.get('parameters') or {}
+            if not isinstance(parameters, dict):
+                self.add('Параметры товара должны быть словарем', row, external_id, 'parameters')
+            elif any(len(str(name)) > MAX_LENGTH or len(str(value)) > MAX_LENGTH for name, value in parameters.items()):
+                self.add(f'Название и значение параметра не должны превышать {MAX_LENGTH} символов',
+                         row, external_id, 'parameters')
+            else:
+                self.parameter_names.update(str(name) for name in parameters)
+        # Категории, которых нет в прайсе, должны уже существовать в базе
+        existing = category_names.get_names(unknown) if unknown else {}
+        for category_id, rows in unknown.items():
+            if category_id not in existing:
+                for row, external_id in rows:
+                    self.add(f'Неизвестная категория {category_id}', row, external_id, 'category')
+        self.errors.sort(key=lambda error: error['row'] or 0)
+        return self.errors
+
+    def _validate_categories(self, categories):
+        result = {}
+        if not isinstance(categories, list):
+            self.add('Раздел categories должен быть списком категорий', field='categories')
+            return result
+        for category in categories:
+            category_id = to_integer(category.get('id')) if isinstance(category, dict) else None
+            if category_id is None or not isinstance(category.get('name'), str) or not category['name'].strip():
+                self.add(f'Проверьте верность введенных данных в пункте Категория: {category}', field='categories')
+                continue
+            if len(category['name']) > MAX_LENGTH:
+                self.add(f'Длина названия категории не должна превышать {MAX_LENGTH} символов',
+                         external_id=category_id, field='categories')
+            result[category_id] = category['name']
+        # Категория с тем же ИД, но другим названием отклоняется при загрузке (PriceImporter.import_categories)
+        existing = category_names.get_names(result) if result else {}
+        for category_id, name in result.items():
+            if category_id in existing and existing[category_id] != name:
+                self.add(f'Категория {category_id} уже существует с названием "{existing[category_id]}"',
+                         external_id=category_id, field='categories')
+        return result
+
+
+def validate_feed(feed, max_errors=None):
+    return FeedValidator(max_errors).validate(feed)
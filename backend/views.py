@@ -1,9 +1,11 @@
+import csv
 import json
 
 from django.core.validators import URLValidator
+from django.db import transaction
 from django.db.utils import IntegrityError
-from django.db.models import Q, Sum, F
-from django.http import JsonResponse
+from django.db.models import Q
+from django.http import HttpResponse
 from django.shortcuts import render
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiParameter, extend_schema_view, inline_serializer
@@ -12,46 +14,56 @@ from rest_framework import status, serializers
 from django.core.exceptions import ValidationError
 from rest_framework.generics import ListAPIView, RetrieveAPIView, get_object_or_404
 from rest_framework.permissions import AllowAny
-from rest_framework.validators import UniqueTogetherValidator
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
 
 from backend.serializers import CategoriesSerializer, ProductInfoSerializer, ShopSerializer, \
-    OrderItemSerializer, OrderSerializer, OrderListSerializer, ProductInfoListSerializer, StatusSerializer
-from backend.models import Category, Shop, ProductInfo, Product, ProductParameter, Parameter, Order, OrderItem
-from backend.tasks import update_state_message_task, send_order_buyer_task, send_order_partner_task
+    OrderItemSerializer, OrderSerializer, OrderListSerializer, ProductInfoListSerializer, StatusSerializer, \
+    ImportJobSerializer, ProductListingSerializer, OrderValuesSerializer, BasketItemSerializer, includes, \
+    request_fields
+from backend.models import Category, Shop, ProductInfo, ProductListing, Order, OrderItem, ImportJob
+from backend.basket import get_basket
+from backend.cache import CachedListMixin, not_modified, orders_etag, request_etag
+from backend.facets import FacetFilterError, facet_counts, filter_by_facets, parse_facet_filters
+from backend.renderers import JsonResponse
+from backend.pagination import CatalogCursorPagination, OrdersCursorPagination, SearchPagination
+from backend.search import search_products
+from backend.tasks import update_state_message_task, send_order_buyer_task, send_order_partner_task, \
+    schedule_price_imports_task
 
-import yaml
 import os
 
 from users.models import Contact
-from users.permissions import IsShop
+from users.permissions import IsShop, IsActivatedOrAnonymousBasket
 from users.views import serializer_error, response_fields
 
 
 @extend_schema_view(get=extend_schema(summary='Просмотр категорий товаров', tags=['Category']))
-class CategoryView(ListAPIView):
+class CategoryView(CachedListMixin, ListAPIView):
     """
     Класс для просмотра категорий
     """
     queryset = Category.objects.all()
     serializer_class = CategoriesSerializer
     permission_classes = [AllowAny]
+    pagination_class = CatalogCursorPagination
 
 @extend_schema_view(get=extend_schema(summary='Просмотр магазинов', tags=['Shops']))
-class ShopView(ListAPIView):
+class ShopView(CachedListMixin, ListAPIView):
     """
     Класс для просмотра магазинов
     """
     queryset = Shop.objects.all()
     serializer_class = ShopSerializer
     permission_classes = [AllowAny]
+    pagination_class = CatalogCursorPagination
 
 @extend_schema_view(get=extend_schema(
     summary='Просмотр товара',
     tags=['Product'],
+    responses=ProductInfoListSerializer(many=True),
     parameters=[
         OpenApiParameter(
             name='shop_id',
@@ -66,15 +78,48 @@ class ShopView(ListAPIView):
             description='Сортировка по категории',
             required=False,
             type=int
+        ),
+        OpenApiParameter(
+            name='param[<имя параметра>]',
+            location=OpenApiParameter.QUERY,
+            description='Фильтр по значению параметра, например param[Цвет]=красный. Можно указать несколько значений',
+            required=False,
+            type=str
+        ),
+        OpenApiParameter(
+            name='price_min',
+            location=OpenApiParameter.QUERY,
+            description='Минимальная цена',
+            required=False,
+            type=float
+        ),
+        OpenApiParameter(
+            name='price_max',
+            location=OpenApiParameter.QUERY,
+            description='Максимальная цена',
+            required=False,
+            type=float
         )
     ]))
-class ProductView(ListAPIView):
+class ProductView(CachedListMixin, ListAPIView):
     """
-    Класс для просмотра продуктов, с возможность сортировки по магазину или категории.
-    При запросе с указанием ID продукта, в ответе выводится расширенный список параметров продукта.
+    Класс для просмотра продуктов, с возможность сортировки по магазину или категории
+    и фильтрации по значениям параметров и цене.
+    В ответе, кроме товаров страницы, выводится количество товаров по значениям параметров (facets).
+    Товары читаются из модели чтения ProductListing без соединений с продуктом, категорией и магазином.
     """
-    serializer_class = ProductInfoListSerializer
+    serializer_class = ProductListingSerializer
     permission_classes = [AllowAny]
+    pagination_class = CatalogCursorPagination
+    cache_shop_param = 'shop_id'
+    with_facets = True
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.facet_filters = parse_facet_filters(request.query_params)
+        except FacetFilterError as error:
+            return JsonResponse({'Status': False, 'Errors': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
 
     def get_queryset(self):
         query = Q()
@@ -83,9 +128,61 @@ class ProductView(ListAPIView):
         if shop_id:
             query = query & Q(shop_id=shop_id)
         if category_id:
-            query = query & Q(product__category_id=category_id)
-        queryset = ProductInfo.objects.filter(query).select_related('product__category', 'shop')
-        return queryset
+            query = query & Q(category_id=category_id)
+        queryset = ProductListing.objects.filter(query)
+        return filter_by_facets(queryset, *self.facet_filters)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.with_facets:
+            response.data['facets'] = facet_counts(self.get_queryset())
+        return response
+
+
+@extend_schema_view(get=extend_schema(
+    summary='Поиск товаров',
+    tags=['Product'],
+    responses=ProductInfoListSerializer(many=True),
+    parameters=[
+        OpenApiParameter(
+            name='q',
+            location=OpenApiParameter.QUERY,
+            description='Поисковый запрос по названию, модели и параметрам товара',
+            required=True,
+            type=str
+        ),
+        OpenApiParameter(
+            name='shop_id',
+            location=OpenApiParameter.QUERY,
+            description='Поиск в магазине',
+            required=False,
+            type=int
+        ),
+        OpenApiParameter(
+            name='category_id',
+            location=OpenApiParameter.QUERY,
+            description='Поиск в категории',
+            required=False,
+            type=int
+        )
+    ]))
+class ProductSearchView(ProductView):
+    """
+    Класс для полнотекстового поиска товаров. Результаты упорядочены по релевантности.
+    """
+    pagination_class = SearchPagination
+    with_facets = False
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params.get('q', '').strip():
+            return JsonResponse({'Status': False, 'Errors': 'Не указан поисковый запрос'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(search_products(self.request.query_params['q'], queryset))
+        product_infos = queryset.in_bulk([product_info_id for product_info_id, _ in page])
+        return [product_infos[product_info_id] for product_info_id, _ in page]
 
 
 @extend_schema_view(get=(extend_schema(tags=['Product'], summary='Просмотр всех товаров')))
@@ -95,23 +192,29 @@ class ProductViewRetrieve(RetrieveAPIView):
     queryset = ProductInfo.objects.all()
 
     def get_object(self):
-        return get_object_or_404(self.queryset.select_related('product__category', 'shop').prefetch_related('product_parameters__parameter'), id=self.kwargs["product_id"])
+        queryset = self.queryset
+        related = ProductInfoSerializer.related_fields(*request_fields(self.get_serializer_context()))
+        if related:
+            queryset = queryset.select_related(*related)
+        return get_object_or_404(queryset, id=self.kwargs["product_id"])
 
 
 class BasketView(APIView):
     """
-    Класс для работы с корзиной покупателя
+    Класс для работы с корзиной покупателя. Корзина хранится в хранилище settings.BASKET_BACKEND
+    (backend.basket), при хранении в Redis доступна и анонимным пользователям.
     """
     serializer_class = OrderSerializer
+    permission_classes = [IsActivatedOrAnonymousBasket]
+
     @extend_schema(summary="Просмотр корзины пользователя", tags=['Basket'])
     def get(self, request, *args, **kwargs):
-        basket = Order.objects.filter(
-            user_id=request.user.id, status='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-        serializer = OrderSerializer(basket, many=True)
-        return Response(serializer.data)
+        basket = get_basket(request)
+        etag = request_etag(request, basket.etag())
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        return Response(basket.data({'request': request}), headers={'ETag': etag})
 
     @extend_schema(
         summary="Создание корзины пользователя",
@@ -140,28 +243,18 @@ class BasketView(APIView):
             return JsonResponse(
                 {'Status': False, 'value_error': 'Список товаров пуст. Пожалуйста выберите товары из каталога'},
                 status=status.HTTP_400_BAD_REQUEST)
-        order, _ = Order.objects.get_or_create(user_id=request.user.id, status='basket')
-        objects_created = []
-        error_message = {"Status": False, 'error':[]}
-        for product_info_item in items:
-            product_info_item.update({'order': order.id})
-            serializer = OrderItemSerializer(data=product_info_item, validators=[
-            UniqueTogetherValidator(
-                queryset=OrderItem.objects.all(),
-                fields=['order', 'product_info'], message='Товар уже добавлен в корзину'
-            )
-        ])
-            if serializer.is_valid():
-                objects_created.append(serializer)
-            else:
-                error_message['error'].append({"product_id": product_info_item['product_info'], 'error': serializer.errors})
-        if bool(error_message['error']):
+        serializer = BasketItemSerializer(data=items, many=True, context={'basket': get_basket(request)})
+        if not serializer.is_valid():
+            error_message = {"Status": False, 'error': [
+                {"product_id": item.get('product_info') if isinstance(item, dict) else None, 'error': errors}
+                for item, errors in zip(items, serializer.errors) if errors]}
             return JsonResponse(error_message, status=400)
-        response = []
-        for serializer in objects_created:
-            serializer.is_valid()
-            serializer.save()
-            response.append(serializer.data)
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            return JsonResponse({"Status": False, 'error': 'Товар уже добавлен в корзину'}, status=400)
+        response = serializer.data
         return JsonResponse({"Status":True, "Response":response}, status=200)
 
     @extend_schema(
@@ -186,28 +279,18 @@ class BasketView(APIView):
         if items:
             if type(items) != list:
                 return JsonResponse({'Status': False, 'value_error': 'Неверный формат запроса. Ожидается список товаров.'}, status=status.HTTP_400_BAD_REQUEST)
-            basket, _ = Order.objects.get_or_create(user_id=request.user.id, status='basket')
-            serializer_list = []
-            error_updated = {'Status': False, 'error': []}
-            for order_item in items:
-                order_item.update({'order': basket.id})
-                serializer = OrderItemSerializer(data=order_item)
-                if serializer.is_valid():
-                    instance = OrderItem.objects.filter(
-                        order_id=basket.id,
-                        product_info_id=order_item['product_info']
-                    )
-                    serializer.instance = instance.first()
-                    serializer_list.append(serializer)
-                else:
-                    error_updated['error'].append(serializer.errors)
-            if bool(error_updated['error']):
-                return JsonResponse(error_updated, status=status.HTTP_400_BAD_REQUEST)
-            response = {'Status': True, 'update_object': []}
-            for serializer in serializer_list:
-                serializer.is_valid()
-                serializer.save()
-                response['update_object'].append(serializer.data)
+            serializer = BasketItemSerializer(data=items, many=True,
+                                              context={'basket': get_basket(request), 'update': True})
+            if not serializer.is_valid():
+                return JsonResponse({'Status': False, 'error': [errors for errors in serializer.errors if errors]},
+                                    status=status.HTTP_400_BAD_REQUEST)
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError:
+                return JsonResponse({'Status': False, 'error': 'Товар уже добавлен в корзину'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+            response = {'Status': True, 'update_object': serializer.data}
             return JsonResponse(response, status=status.HTTP_200_OK)
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -225,30 +308,19 @@ class BasketView(APIView):
         if items:
             if type(items) != list:
                 return JsonResponse({'Status': False, 'Errors': 'Неверный формат запроса. Ожидается список товаров.'}, status=status.HTTP_400_BAD_REQUEST)
-            basket, _ = Order.objects.get_or_create(user_id=request.user.id, status='basket')
-            objects_list = []
-            error_deleted = []
-            for order_item in items:
-                if type(order_item['product_info']) == int:
-                    object = OrderItem.objects.filter(
-                        order_id=basket.id,
-                        product_info_id=order_item['product_info']
-                    )
-                    if object.exists():
-                        objects_list.append(object)
-                    else:
-                        error_deleted.append(order_item)
-                elif order_item['product_info'] == 'all':
-                    OrderItem.objects.filter(
-                        order_id=basket.id).delete()
-                    return JsonResponse({'Status': True, 'Response': "Корзина очищена"}, status=status.HTTP_200_OK)
-                else:
-                    error_deleted.append(order_item)
+            basket = get_basket(request)
+            if any(isinstance(order_item, dict) and order_item.get('product_info') == 'all' for order_item in items):
+                basket.clear()
+                return JsonResponse({'Status': True, 'Response': "Корзина очищена"}, status=status.HTTP_200_OK)
+            product_info_ids = {order_item['product_info'] for order_item in items
+                                if isinstance(order_item, dict) and type(order_item.get('product_info')) == int}
+            added = set(basket.items(product_info_ids))
+            error_deleted = [order_item for order_item in items if not isinstance(order_item, dict)
+                             or order_item.get('product_info') not in added]
             if bool(error_deleted):
                 return JsonResponse({'Status': False, 'Таких товаров нет в корзине': error_deleted}, status=status.HTTP_400_BAD_REQUEST)
-            elif len(items) == len(objects_list):
-                object_deleted = [obj.delete() for obj in objects_list]
-                return JsonResponse({'Status': True, 'Response': 'Все записи были удалены'}, status=status.HTTP_200_OK)
+            basket.remove(added)
+            return JsonResponse({'Status': True, 'Response': 'Все записи были удалены'}, status=status.HTTP_200_OK)
         return JsonResponse({'Status': False, 'value_error': 'Не указаны все необходимые аргументы'}, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -259,45 +331,52 @@ class OrderView(APIView):
     serializer_class = OrderSerializer
     @extend_schema(summary="Просмотр заказов пользователя", tags=['Order.Buyer'], request=None)
     def get(self, request, *args, **kwargs):
-        order = Order.objects.filter(
-            user_id=request.user.id).exclude(status='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-        serializer = self.serializer_class(order, many=True)
-        return Response(serializer.data)
+        etag = request_etag(request, orders_etag(Order.objects.filter(user_id=request.user.id).exclude(status='basket')))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        order = Order.objects.filter(user_id=request.user.id).exclude(status='basket')
+        serializer = OrderValuesSerializer(order, many=True, context={'request': request})
+        return Response(serializer.data, headers={'ETag': etag})
 
     @extend_schema(summary="Оформление заказа пользователя", tags=['Order.Buyer'], responses=response_fields('Order'))
     def post(self, request, *args, **kwargs):
         contact = request.data.get('contact_id')
-        try:
-            update_object = Order.objects.filter(user=request.user.id, status='basket').prefetch_related('ordered_items__product_info__shop')
-            order = update_object.first()
-        except ValueError:
-            return JsonResponse({'Status': False, 'value_error': 'Неверно указаны элементы заказа.'}, status=status.HTTP_400_BAD_REQUEST)
-        else:
-            if order:
-                if order.contact or contact:
-                    for obj in order.ordered_items.all():
-                        if obj.quantity > obj.product_info.quantity:
-                            return JsonResponse(
-                                {'Status': False,
-                                 'quantity_error': f'У поставщика больше нет такого количества товара. Вы можете заказать не более {obj.product_info.quantity} единиц.'}, status=status.HTTP_400_BAD_REQUEST)
-                    c = Contact.objects.filter(id=contact, user_id=request.user.id)
-                    if c.exists():
-                        update_object.update(status='placed', contact=contact)
-                    else:
-                        return JsonResponse({'Status': False, 'contact_error': 'Неверно указанеы контакты пользователя.'}, status=status.HTTP_400_BAD_REQUEST)
-                    send_order_buyer_task.delay(request.user.email, order.id)
-                    order.quantity_and_status_update()
-                    partner_email = list(order.ordered_items.all().values_list("product_info__shop__user__email", flat=True).distinct())
-                    for email in partner_email:
-                        send_order_partner_task.delay(email, order.id)
-                    return JsonResponse({'Status': True, 'Response': f'Заказ успешно подтвержден.'}, status=status.HTTP_200_OK)
-                else:
-                    return JsonResponse({'Status': False, 'contact_error': 'Контакты пользователя не указаны.'}, status=status.HTTP_400_BAD_REQUEST)
-            else:
-                return JsonResponse({'Status': False, 'Errors': 'Корзина пуста.'}, status=status.HTTP_400_BAD_REQUEST)
+        basket = get_basket(request)
+        with transaction.atomic():
+            order = basket.checkout()
+            response = self.place_order(order, contact, request.user.id)
+            if response is not None:
+                # Заказ, записанный из корзины в Redis при оформлении, не сохраняется при ошибке
+                transaction.set_rollback(True)
+                return response
+        basket.discard()
+        send_order_buyer_task.delay(request.user.email, order.id)
+        partner_email = list(order.ordered_items.all().values_list("product_info__shop__user__email", flat=True).distinct())
+        for email in partner_email:
+            send_order_partner_task.delay(email, order.id)
+        return JsonResponse({'Status': True, 'Response': f'Заказ успешно подтвержден.'}, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def place_order(order, contact, user_id):
+        """
+        Проверяет заказ из корзины и контакты и переводит заказ в статус placed.
+        Возвращает ответ с ошибкой или None после оформления.
+        """
+        if not order:
+            return JsonResponse({'Status': False, 'Errors': 'Корзина пуста.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not (order.contact or contact):
+            return JsonResponse({'Status': False, 'contact_error': 'Контакты пользователя не указаны.'}, status=status.HTTP_400_BAD_REQUEST)
+        for obj in order.ordered_items.all():
+            if obj.quantity > obj.product_info.quantity:
+                return JsonResponse(
+                    {'Status': False,
+                     'quantity_error': f'У поставщика больше нет такого количества товара. Вы можете заказать не более {obj.product_info.quantity} единиц.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Contact.objects.filter(id=contact, user_id=user_id).exists():
+            return JsonResponse({'Status': False, 'contact_error': 'Неверно указанеы контакты пользователя.'}, status=status.HTTP_400_BAD_REQUEST)
+        order.update_total(refresh_prices=True)
+        Order.objects.filter(id=order.id).update(status='placed', contact=contact, updated_at=timezone.now())
+        order.quantity_and_status_update()
 
 
 class PartnerState(APIView):
@@ -353,14 +432,14 @@ class PartnerOrders(APIView):
         order_items = OrderItem.objects.filter(
             product_info__shop__user_id=request.user.id,
             order_id=order_id).exclude(
-            order__status='basket').prefetch_related(
-            'product_info__shop__user',
-            'product_info__product__category',
-            'product_info__product_parameters__parameter',
-            'order').annotate(
-            total_sum=Sum(F('quantity') * F('product_info__price')))
+            order__status='basket')
+        fields, expand = request_fields({'request': request})
+        if 'product_info' in expand and includes(fields, 'product_info'):
+            related = ProductInfoSerializer.related_fields(fields.get('product_info', {}), expand['product_info'],
+                                                           prefix='product_info__')
+            order_items = order_items.select_related('product_info', *related)
         if order_items.exists():
-            serializer = self.serializer_class(order_items, many=True)
+            serializer = self.serializer_class(order_items, many=True, context={'request': request})
             return Response(serializer.data)
         else:
             return JsonResponse({'Status': False, 'Errors': 'Заказ не найден. Проверьте номер заказа.'})
@@ -370,6 +449,8 @@ class PartnerOrders(APIView):
 class PartnerOrdersList(ListAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderListSerializer
+    pagination_class = OrdersCursorPagination
+
     def get_queryset(self):
         query = super().get_queryset()
         return query.filter(ordered_items__product_info__shop__user_id=self.request.user.id)\
@@ -414,57 +495,46 @@ class PartnerUpdate(APIView):
                 os.stat(filename)
             except FileNotFoundError:
                 return JsonResponse({'Status': False, 'url_error': 'Файл не найден'}, status=400)
-            # Чтение файла
-            with open(request.data['filename'], encoding="utf-8") as fh:
-                read_data = yaml.load(fh, Loader=yaml.SafeLoader)
-                # Создаем или извлекаем магазин
-                try:
-                    shop, _ = Shop.objects.get_or_create(name=read_data['shop'], user_id=user.id)
-                except IntegrityError:
-                    return JsonResponse(
-                        {'Status': False, 'file_error': 'Не указано название магазина или указано неверно'}, status=400)
-                shop.filename, shop.url, shop.last_update = request.data['filename'], url, timezone.now()
-                shop.save()
-                # Создаем или извлекаем категории
-                for category in read_data['categories']:
-                    try:
-                        category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                    except IntegrityError:
-                        return JsonResponse(
-                            {'Status': False,
-                             'file_error': 'Проверьте верность введенных данных в пункте Категория'}, status=400)
-                    except KeyError as error:
-                        return JsonResponse(
-                            {'Status': False,
-                             'file_error': f'В одном или нескольких значениях списка Категорий отсутствует поле {error}'}, status=400)
-                    category_object.shops.add(shop.id)
-                    category_object.save()
-                # Удаляем прошлые продукты
-                ProductInfo.objects.filter(shop=shop.id).delete()
-                # Добавляем или извлекаем товары
-                for item in read_data['goods']:
-                    try:
-                        product, _ = Product.objects.get_or_create(name=item['name'],
-                                                                   category_id=item['category'])
-                        product_info = ProductInfo.objects.create(product_id=product.id,
-                                                                  external_id=item['id'],
-                                                                  model=item['model'],
-                                                                  price=item['price'],
-                                                                  price_rrc=item['price_rrc'],
-                                                                  quantity=item['quantity'],
-                                                                  shop_id=shop.id)
-                    except IntegrityError:
-                        return JsonResponse(
-                            {'Status': False,
-                             'file_error': 'Проверьте верность введенных данных в пункте Товары'}, status=400)
-                    except KeyError as error:
-                        return JsonResponse(
-                            {'Status': False,
-                             'file_error': f'В одном или нескольких значениях списка Товаров отсутствует поле {error}'}, status=400)
-                    for name, value in item['parameters'].items():
-                        parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                        ProductParameter.objects.create(product_info_id=product_info.id,
-                                                        parameter_id=parameter_object.id,
-                                                        value=str(value))
-                return JsonResponse({'Status': True, 'Response': 'Прайс успешно обновлен'}, status=200)
+            # Загрузка выполняется в фоне, в ответе возвращается номер задачи
+            job = ImportJob.objects.create(user_id=user.id, filename=filename, url=url)
+            schedule_price_imports_task.delay([job.id])
+            return JsonResponse({'Status': True, 'Response': 'Прайс поставлен в очередь на загрузку', 'job_id': job.id},
+                                status=200)
         return JsonResponse({'Status': False, 'field_error': 'Не указаны все необходимые аргументы'}, status=400)
+
+
+class PartnerUpdateStatus(APIView):
+    """
+    Класс для просмотра хода загрузки прайса
+    """
+    permission_classes = [*api_settings.DEFAULT_PERMISSION_CLASSES, IsShop]
+    serializer_class = ImportJobSerializer
+
+    @extend_schema(summary="Просмотр статуса загрузки прайса", tags=['Price'])
+    def get(self, request, *args, **kwargs):
+        job = ImportJob.objects.filter(id=kwargs.get('job_id'), user_id=request.user.id).first()
+        if job:
+            return Response(self.serializer_class(job).data)
+        return JsonResponse({'Status': False, 'Errors': 'Загрузка не найдена. Проверьте номер загрузки.'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+
+class PartnerUpdateReport(APIView):
+    """
+    Класс для выгрузки отчета об ошибках загрузки прайса в формате CSV
+    """
+    permission_classes = [*api_settings.DEFAULT_PERMISSION_CLASSES, IsShop]
+
+    @extend_schema(summary="Отчет об ошибках загрузки прайса", tags=['Price'],
+                   responses={(200, 'text/csv'): str})
+    def get(self, request, *args, **kwargs):
+        job = ImportJob.objects.filter(id=kwargs.get('job_id'), user_id=request.user.id).first()
+        if not job:
+            return JsonResponse({'Status': False, 'Errors': 'Загрузка не найдена. Проверьте номер загрузки.'},
+                                status=status.HTTP_404_NOT_FOUND)
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="import_{job.id}_errors.csv"'
+        writer = csv.DictWriter(response, fieldnames=('row', 'id', 'field', 'error'), extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(job.errors)
+        return response
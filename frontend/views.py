@@ -6,7 +6,9 @@ from django.shortcuts import render, get_object_or_404, redirect
 import requests
 from django.urls import reverse
 
-from backend.models import ProductInfo, Order, OrderItem
+from backend.basket import get_basket
+from backend.models import ProductInfo
+from backend.serializers import BasketItemSerializer
 from frontend.forms import RegisterForm, ProductForm, LoginForm, CodeForm
 from users.models import User, UserManager
 
@@ -67,8 +69,14 @@ def products(request, product_id=None):
     if product_id:
         if request.method == "POST":
             quantity = request.POST.get("quantity")
-            basket, _ = Order.objects.get_or_create(status='basket', user_id=request.user.id)
-            OrderItem.objects.create(quantity=quantity, order=basket, product_info_id=product_id)
+            basket = get_basket(request)
+            if basket is None:
+                return HttpResponse('Вы не авторизованы')
+            serializer = BasketItemSerializer(data=[{'product_info': product_id, 'quantity': quantity}], many=True,
+                                              context={'basket': basket, 'update': True})
+            if not serializer.is_valid():
+                return HttpResponse(f"Ошибка добавления товара: {serializer.errors[0]}", status=400)
+            serializer.save()
             return HttpResponse(f"Товар успешно добавлен в корзину")
 
         else:
@@ -77,12 +85,13 @@ def products(request, product_id=None):
             return render(request, "backend/product.html", {'product': product, 'form': form})
 
     else:
-        products = ProductInfo.objects.all()
+        products = ProductInfo.objects.filter(is_active=True)
         return render(request, "backend/products.html", {'products': products})
 
 
 def basket(request):
-        basket = OrderItem.objects.filter(order__status='basket', order__user_id=request.user.id)
-        return render(request, "backend/basket.html", {'orderitem': basket, 'request': request})
+        basket = get_basket(request)
+        order_items = basket.order_items() if basket is not None else []
+        return render(request, "backend/basket.html", {'orderitem': order_items, 'basket': basket, 'request': request})
 
 
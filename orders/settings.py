@@ -165,6 +165,10 @@ REST_FRAMEWORK = {
             'rest_framework.permissions.IsAuthenticated',
             'users.permissions.IsActivated'
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'TEST_REQUEST_DEFAULT_FORMAT': 'json'
 
@@ -198,6 +202,49 @@ CELERY_RESULT_BACKEND = "redis://localhost:6379"
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TASK_SERIALIZER = 'json'
+CELERY_BEAT_SCHEDULE = {
+    'fetch-price-lists': {
+        'task': 'backend.tasks.fetch_price_lists_task',
+        'schedule': float(os.getenv('PRICE_FETCH_INTERVAL', 3600)),
+    },
+}
+
+# price lists
+PRICE_DOWNLOAD_DIR = os.path.join(BASE_DIR, 'prices')
+PRICE_FETCH_TIMEOUT = 60
+PRICE_IMPORT_BATCH_SIZE = 1000
+PRICE_IMPORT_PROGRESS_TIMEOUT = 24 * 60 * 60
+PRICE_IMPORT_MAX_ERRORS = 1000
+
+# cache
+# Без CACHE_URL (например, в тестах) используется кеш в памяти процесса
+if os.getenv('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+CATALOG_CACHE_TIMEOUT = 15 * 60
+# Как часто процесс сверяет свой кеш имен категорий и параметров с общей версией (секунды)
+NAME_CACHE_CHECK_INTERVAL = 1
+
+# basket
+# database - корзина в Order/OrderItem со статусом basket, redis - в хешах Redis по адресу BASKET_REDIS_URL
+# (доступна и анонимным пользователям, в таблицы заказов записывается только при оформлении заказа)
+BASKET_BACKEND = os.getenv('BASKET_BACKEND', 'database')
+# Отдельная база Redis: кеш (CACHE_URL, база 1) очищается FLUSHDB и вытесняется, корзины терять нельзя
+BASKET_REDIS_URL = os.getenv('BASKET_REDIS_URL', 'redis://localhost:6379/2')
+BASKET_TTL = 30 * 24 * 60 * 60
+
+# search
+SEARCH_CONFIG = 'russian'
 
 #social_oauth
 SOCIAL_AUTH_VK_OAUTH2_KEY = os.getenv('SOCIAL_AUTH_VK_OAUTH_KEY')
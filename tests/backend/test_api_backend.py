@@ -1,15 +1,32 @@
+import datetime
+import io
 import json
+import re
+from decimal import Decimal
 
 import pytest
+import yaml
 from django.conf import settings
 import os
 from pytest_lazyfixture import lazy_fixture
 
 from django.contrib.auth import authenticate
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.translation import gettext_lazy
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework.authtoken.models import Token
-
-from backend.models import ProductInfo, Order, OrderItem
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from backend.models import ProductInfo, Order, OrderItem, Shop, Category, Product, ProductListing
+from backend import basket, renderers
+from backend.importer import PriceImporter
+from backend.management.commands.benchmark_price_import import generate_price
+from backend.serializers import ProductInfoListSerializer, OrderSerializer, OrderValuesSerializer
 from users.models import User, Contact
 
 
@@ -123,7 +140,157 @@ def test_product_list(client, price_yandex, price_svyaznoy):
     response = client.get(
         '/api/v1/products/')
     assert response.status_code == 200
-    assert len(response.json()) == count
+    assert len(response.json()['results']) == count
+
+
+@pytest.mark.django_db
+def test_product_list_listing(client, price_yandex, price_svyaznoy, django_assert_max_num_queries):
+    product_info = ProductInfo.objects.first()
+    product_info.quantity -= 1
+    product_info.save()
+    # Список читается из ProductListing: число запросов не зависит от числа товаров на странице
+    with django_assert_max_num_queries(4):
+        response = client.get('/api/v1/products/?page_size=500')
+    assert response.status_code == 200
+    expected = ProductInfoListSerializer(ProductInfo.objects.order_by('id'), many=True).data
+    assert response.json()['results'] == json.loads(json.dumps(expected))
+
+
+@pytest.mark.parametrize(
+    "url, model",
+    [
+        ('/api/v1/products/', ProductInfo),
+        ('/api/v1/shops/', Shop),
+        ('/api/v1/categories/', Category),
+    ]
+)
+@pytest.mark.django_db
+def test_catalog_cursor_pagination(client, price_yandex, price_svyaznoy, url, model):
+    url, ids = f'{url}?page_size=2', []
+    while url:
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert len(response.json()['results']) <= 2
+        # Страница выбирается по курсору, а не смещением
+        assert not any('OFFSET' in query['sql'] for query in queries.captured_queries)
+        ids.extend(item['id'] for item in response.json()['results'])
+        url = response.json()['next']
+    assert ids == list(model.objects.order_by('id').values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+def test_catalog_cache(client, price_yandex, price_svyaznoy, shop_yandex_token, tmp_path,
+                       django_capture_on_commit_callbacks, django_assert_num_queries):
+    yandex, svyaznoy = price_yandex.first().shop_id, price_svyaznoy.first().shop_id
+    urls = ['/api/v1/products/', f'/api/v1/products/?shop_id={yandex}', f'/api/v1/products/?shop_id={svyaznoy}',
+            '/api/v1/shops/', '/api/v1/categories/']
+    with django_capture_on_commit_callbacks(execute=True):
+        responses = {url: client.get(url).json() for url in urls}
+    with django_assert_num_queries(0):
+        for url in urls:
+            assert client.get(url).json() == responses[url]
+
+    # Повторная загрузка прайса меняет версию каталога магазина, каталог другого магазина остается в кеше
+    with open(os.path.join(settings.BASE_DIR, 'data/shop_yandexmarket.yaml'), encoding='utf-8') as fh:
+        price_data = yaml.safe_load(fh)
+    price_data['goods'][0]['price'] += 100
+    path = tmp_path / 'shop_yandexmarket.yaml'
+    with open(path, 'w', encoding='utf-8') as fh:
+        yaml.safe_dump(price_data, fh, allow_unicode=True, sort_keys=False)
+    client.post('/api/v1/partner/update/', data={'url': 'https://www.yandex-market.ru', 'filename': str(path)},
+                headers={'Authorization': shop_yandex_token})
+    with django_assert_num_queries(0):
+        assert client.get(f'/api/v1/products/?shop_id={svyaznoy}').json() == \
+               responses[f'/api/v1/products/?shop_id={svyaznoy}']
+    prices = {item['id']: item['price'] for item in client.get(f'/api/v1/products/?shop_id={yandex}').json()['results']}
+    product_info = price_yandex.get(external_id=price_data['goods'][0]['id'])
+    assert float(prices[product_info.id]) == price_data['goods'][0]['price']
+    assert client.get('/api/v1/products/').json() != responses['/api/v1/products/']
+
+    # Изменение остатка товара сбрасывает кеш после фиксации транзакции
+    with django_capture_on_commit_callbacks(execute=True):
+        product_info.quantity = 1
+        product_info.save()
+    quantities = {item['id']: item['quantity']
+                  for item in client.get(f'/api/v1/products/?shop_id={yandex}').json()['results']}
+    assert quantities[product_info.id] == 1
+
+
+@pytest.mark.parametrize(
+    "query, count",
+    [
+        ('iphone xr', 6),
+        ('Красный', 2),
+        ('512', 2),
+        ('nokia', 0),
+    ]
+)
+@pytest.mark.django_db
+def test_product_search(client, price_yandex, price_svyaznoy, query, count):
+    response = client.get('/api/v1/products/search/', {'q': query, 'page_size': 4})
+    assert response.status_code == 200
+    assert response.json()['count'] == count
+    ids = [item['id'] for item in response.json()['results']]
+    if response.json()['next']:
+        ids += [item['id'] for item in client.get(response.json()['next']).json()['results']]
+    assert len(set(ids)) == count
+    shop_id = price_yandex.first().shop_id
+    response = client.get('/api/v1/products/search/', {'q': query, 'shop_id': shop_id})
+    assert {item['shop'] for item in response.json()['results']} <= {shop_id}
+    assert response.json()['count'] == count // 2
+
+
+@pytest.mark.django_db
+def test_product_search_ranking(client, price_yandex):
+    red, black = price_yandex.get(external_id=2216313), price_yandex.get(external_id=2216226)
+    black.model = 'красный'
+    black.save()
+    # Совпадение в названии и параметрах выше совпадения только в модели
+    results = client.get('/api/v1/products/search/', {'q': 'красный'}).json()['results']
+    assert [item['id'] for item in results] == [red.id, black.id]
+    assert client.get('/api/v1/products/search/').status_code == 400
+
+
+@pytest.mark.django_db
+def test_refresh_search_vectors(client, price_yandex):
+    product_info = price_yandex.first()
+    assert client.get('/api/v1/products/search/', {'q': 'переиндексация'}).json()['count'] == 0
+    # Изменение в обход сигналов (как у товаров, загруженных до появления поиска) не попадает в индекс
+    ProductInfo.objects.filter(id=product_info.id).update(model='переиндексация')
+    assert client.get('/api/v1/products/search/', {'q': 'переиндексация'}).json()['count'] == 0
+    call_command('refresh_search_vectors', stdout=io.StringIO())
+    results = client.get('/api/v1/products/search/', {'q': 'переиндексация'}).json()['results']
+    assert [item['id'] for item in results] == [product_info.id]
+
+
+@pytest.mark.parametrize(
+    "params, count",
+    [
+        ({'param[Цвет]': ['Красный', 'черный']}, 4),
+        ({'param[Цвет]': ['красный', 'черный'], 'param[Встроенная память (Гб)]': '256'}, 4),
+        ({'param[Цвет]': 'красный', 'param[Встроенная память (Гб)]': '128'}, 0),
+        ({'param[Вес]': '100'}, 0),
+        ({'price_max': '60000'}, 3),
+        ({'price_min': '65000', 'param[Цвет]': 'синий'}, 1),
+    ]
+)
+@pytest.mark.django_db
+def test_product_facet_filters(client, price_yandex, price_svyaznoy, params, count):
+    response = client.get('/api/v1/products/', params)
+    assert response.status_code == 200
+    assert len(response.json()['results']) == count
+    assert sum(response.json()['facets']['parameters'].get('Цвет', {}).values()) == count
+
+
+@pytest.mark.django_db
+def test_product_facet_counts(client, price_yandex, price_svyaznoy):
+    facets = client.get('/api/v1/products/', {'shop_id': price_yandex.first().shop_id}).json()['facets']
+    assert facets['parameters']['Цвет'] == {'золотистый': 1, 'красный': 1, 'синий': 1, 'черный': 1}
+    assert facets['parameters']['Встроенная память (Гб)'] == {'256': 3, '512': 1}
+    prices = price_yandex.values_list('price', flat=True)
+    assert (facets['price']['min'], facets['price']['max']) == (float(min(prices)), float(max(prices)))
+    assert client.get('/api/v1/products/', {'price_min': 'abc'}).status_code == 400
 
 
 @pytest.mark.django_db
@@ -216,6 +383,186 @@ def test_basket_create(client, user_buyer, buyer_token, price_svyaznoy, product_
         assert OrderItem.objects.filter(order__status='basket', order__user=user_buyer).count() == count
 
 
+@pytest.fixture
+def price_generated(user_shop_yandex, tmp_path):
+    path = tmp_path / 'price.yaml'
+    generate_price(path, 60)
+    with open(path, encoding='utf-8') as fh:
+        price_data = yaml.load(fh, Loader=yaml.SafeLoader)
+    importer = PriceImporter(Shop.objects.create(name='Бенчмарк', user=user_shop_yandex))
+    importer.import_categories(price_data['categories'])
+    importer.import_goods(price_data['goods'])
+    return ProductInfo.objects.filter(shop=importer.shop, quantity__gte=2)
+
+
+@pytest.mark.django_db
+def test_basket_create_batch(client, user_buyer, buyer_token, price_generated, django_assert_max_num_queries):
+    headers = {'Authorization': buyer_token}
+    product_infos = list(price_generated[:50])
+    assert len(product_infos) == 50
+    Order.objects.create(user=user_buyer, status='basket')
+    # Число запросов не зависит от числа позиций: товары, позиции корзины, bulk_create и пересчет суммы
+    with django_assert_max_num_queries(9):
+        response = client.post('/api/v1/basket/', data={'items': [
+            {'product_info': product_info.id, 'quantity': 2} for product_info in product_infos]},
+            content_type='application/json', headers=headers)
+    assert response.status_code == 200
+    assert [item['product_info'] for item in response.json()['Response']] == [item.id for item in product_infos]
+    order = Order.objects.get(user=user_buyer, status='basket')
+    assert order.ordered_items.count() == 50
+    assert client.get('/api/v1/basket/', headers=headers).json()[0]['total_sum'] == \
+           sum(product_info.price * 2 for product_info in product_infos)
+
+    extra = price_generated[50]
+    response = client.post('/api/v1/basket/', data={'items': [
+        {'product_info': extra.id, 'quantity': 1},
+        {'product_info': extra.id, 'quantity': 1},
+        {'product_info': product_infos[0].id, 'quantity': 1},
+        {'product_info': extra.id + 100000, 'quantity': 1},
+        {'product_info': extra.id, 'quantity': extra.quantity + 1},
+    ]}, content_type='application/json', headers=headers)
+    assert response.status_code == 400
+    errors = response.json()['error']
+    assert [error['product_id'] for error in errors] == [extra.id, product_infos[0].id, extra.id + 100000, extra.id]
+    assert 'value_error' in errors[-1]['error']['quantity']
+    assert order.ordered_items.count() == 50
+
+
+@pytest.mark.django_db
+def test_basket_update_delete_batch(client, user_buyer, buyer_token, price_generated, django_assert_max_num_queries):
+    headers = {'Authorization': buyer_token}
+    product_infos = list(price_generated[:50])
+    client.post('/api/v1/basket/', data={'items': [{'product_info': product_info.id, 'quantity': 1}
+                                                   for product_info in product_infos[:40]]},
+                content_type='application/json', headers=headers)
+    # Изменение 40 позиций и добавление 10 новых: bulk_update и bulk_create вместо запросов на каждую позицию
+    with django_assert_max_num_queries(11):
+        response = client.put('/api/v1/basket/', data={'items': [
+            {'product_info': product_info.id, 'quantity': 2} for product_info in product_infos]},
+            content_type='application/json', headers=headers)
+    assert response.status_code == 200
+    assert [item['quantity'] for item in response.json()['update_object']] == [2] * 50
+    order = Order.objects.get(user=user_buyer, status='basket')
+    assert sorted(order.ordered_items.values_list('quantity', flat=True)) == [2] * 50
+    assert client.get('/api/v1/basket/', headers=headers).json()[0]['total_sum'] == \
+           sum(product_info.price * 2 for product_info in product_infos)
+
+    response = client.put('/api/v1/basket/', data={'items': [
+        {'product_info': product_infos[0].id, 'quantity': 1},
+        {'product_info': product_infos[0].id, 'quantity': 3},
+        {'product_info': product_infos[1].id, 'quantity': product_infos[1].quantity + 1},
+    ]}, content_type='application/json', headers=headers)
+    assert response.status_code == 400
+    assert len(response.json()['error']) == 2
+    assert order.ordered_items.get(product_info=product_infos[0]).quantity == 2
+
+    missing = {'product_info': price_generated[50].id}
+    response = client.delete('/api/v1/basket/', data={'items': [{'product_info': product_infos[0].id}, missing]},
+                             content_type='application/json', headers=headers)
+    assert response.status_code == 400
+    assert response.json()['Таких товаров нет в корзине'] == [missing]
+    with django_assert_max_num_queries(7):
+        response = client.delete('/api/v1/basket/', data={'items': [
+            {'product_info': product_info.id} for product_info in product_infos[:30]]},
+            content_type='application/json', headers=headers)
+    assert response.status_code == 200
+    assert order.ordered_items.count() == 20
+    assert client.get('/api/v1/basket/', headers=headers).json()[0]['total_sum'] == \
+           sum(product_info.price * 2 for product_info in product_infos[30:])
+
+
+@pytest.fixture
+def redis_basket(settings, monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    settings.BASKET_BACKEND = 'redis'
+    server = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(basket, 'basket_redis', lambda: server)
+    return server
+
+
+@pytest.mark.django_db
+def test_redis_basket(client, buyer_token, user_buyer, price_yandex, buyer_contact, redis_basket):
+    headers = {'Authorization': buyer_token}
+    product_infos = list(price_yandex.order_by('id')[:3])
+    response = client.post('/api/v1/basket/', data={'items': [
+        {'product_info': product_info.id, 'quantity': 1} for product_info in product_infos]},
+        content_type='application/json', headers=headers)
+    assert response.status_code == 200
+    response = client.post('/api/v1/basket/', data={'items': [{'product_info': product_infos[0].id, 'quantity': 1}]},
+                           content_type='application/json', headers=headers)
+    assert response.status_code == 400
+    response = client.put('/api/v1/basket/', data={'items': [{'product_info': product_infos[0].id, 'quantity': 2}]},
+                          content_type='application/json', headers=headers)
+    assert response.json()['update_object'][0]['total_sum'] == str(product_infos[0].price * 2)
+    response = client.delete('/api/v1/basket/', data={'items': [{'product_info': product_infos[2].id}]},
+                             content_type='application/json', headers=headers)
+    assert response.status_code == 200
+    # Корзина не записывается в таблицы заказов до оформления
+    assert not Order.objects.exists()
+    assert redis_basket.hgetall(f'basket:user:{user_buyer.id}') == {str(product_infos[0].id): '2',
+                                                                    str(product_infos[1].id): '1'}
+
+    response = client.get('/api/v1/basket/', headers=headers)
+    [order] = response.json()
+    assert order['status'] == 'basket'
+    assert [(item['product_info']['id'], item['quantity']) for item in order['ordered_items']] == [
+        (product_infos[0].id, 2), (product_infos[1].id, 1)]
+    assert order['total_sum'] == product_infos[0].price * 2 + product_infos[1].price
+    assert client.get('/api/v1/basket/', headers={**headers, 'If-None-Match': response['ETag']}).status_code == 304
+
+    # Ошибка оформления не оставляет заказ в базе данных и не очищает корзину
+    response = client.post('/api/v1/order/', data={}, content_type='application/json', headers=headers)
+    assert response.status_code == 400
+    assert not Order.objects.exists()
+    response = client.post('/api/v1/order/', data={'contact_id': buyer_contact.id}, content_type='application/json',
+                           headers=headers)
+    assert response.status_code == 200
+    order = Order.objects.get(user=user_buyer)
+    assert order.status == 'placed'
+    assert sorted(order.ordered_items.values_list('product_info_id', 'quantity')) == [
+        (product_infos[0].id, 2), (product_infos[1].id, 1)]
+    assert order.total_sum == product_infos[0].price * 2 + product_infos[1].price
+    assert not redis_basket.exists(f'basket:user:{user_buyer.id}')
+    assert client.get('/api/v1/basket/', headers=headers).json() == []
+
+
+@pytest.mark.django_db
+def test_redis_basket_anonymous(client, user_buyer, price_yandex, redis_basket, settings):
+    product_info = price_yandex.first()
+    item = {'product_info': product_info.id, 'quantity': 1}
+    response = client.post('/api/v1/basket/', data={'items': [item]}, content_type='application/json')
+    assert response.status_code == 200
+    assert client.get('/api/v1/basket/').json()[0]['ordered_items'][0]['product_info']['id'] == product_info.id
+    assert client.get('/basket/').context['orderitem'][0].product_info == product_info
+
+    # После входа корзина анонимного пользователя переносится в корзину пользователя
+    client.login(email=user_buyer.email, password='testpassword')
+    assert redis_basket.hgetall(f'basket:user:{user_buyer.id}') == {str(product_info.id): '1'}
+    assert redis_basket.keys('basket:anonymous:*') == []
+
+    client.logout()
+    settings.BASKET_BACKEND = 'database'
+    response = client.post('/api/v1/basket/', data={'items': [item]}, content_type='application/json')
+    assert response.status_code in (401, 403)
+
+
+@pytest.mark.django_db
+def test_redis_basket_api_login(client, user_buyer, price_yandex, redis_basket):
+    product_info = price_yandex.first()
+    item = {'product_info': product_info.id, 'quantity': 2}
+    client.post('/api/v1/basket/', data={'items': [item]}, content_type='application/json')
+
+    # Вход по токену тоже переносит корзину, собранную до входа
+    response = client.post('/api/v1/user/login/', data={'email': user_buyer.email, 'password': 'testpassword'},
+                           content_type='application/json')
+    assert response.status_code == 200
+    assert redis_basket.hgetall(f'basket:user:{user_buyer.id}') == {str(product_info.id): '2'}
+    assert redis_basket.keys('basket:anonymous:*') == []
+    headers = {'Authorization': f'Token {response.json()["Response"]["token"]}'}
+    response = client.get('/api/v1/basket/', headers=headers)
+    assert response.json()[0]['ordered_items'][0]['product_info']['id'] == product_info.id
+
+
 @pytest.mark.django_db
 def test_basket_list(client, buyer_token):
     response = client.get(
@@ -277,6 +624,122 @@ def test_buyer_order_list(client, buyer_token, user_buyer, product_in_basket):
     assert response.status_code == 200
 
 
+@pytest.mark.django_db
+def test_basket_and_order_etag(client, buyer_token, basket_product, buyer_contact, django_assert_max_num_queries):
+    headers = {'Authorization': buyer_token}
+    basket = client.get('/api/v1/basket/', headers=headers)
+    orders = client.get('/api/v1/order/', headers=headers)
+    assert basket.status_code == orders.status_code == 200
+    # Неизменившийся ответ: аутентификация и один агрегирующий запрос, без сериализации
+    with django_assert_max_num_queries(2):
+        response = client.get('/api/v1/basket/', headers={**headers, 'If-None-Match': basket['ETag']})
+    assert response.status_code == 304
+    assert response['ETag'] == basket['ETag']
+    # Ответ с другим набором полей или в другом формате получает свой ETag
+    response = client.get('/api/v1/basket/?fields=id', headers={**headers, 'If-None-Match': basket['ETag']})
+    assert response.status_code == 200
+    assert response['ETag'] != basket['ETag']
+    response = client.get('/api/v1/order/', headers={**headers, 'If-None-Match': orders['ETag'], 'Accept': 'text/html'})
+    assert response.status_code == 200
+    assert response['ETag'] != orders['ETag']
+
+    client.put('/api/v1/basket/', data={'items': [{'product_info': basket_product.product_info_id, 'quantity': 1}]},
+               content_type='application/json', headers=headers)
+    response = client.get('/api/v1/basket/', headers={**headers, 'If-None-Match': basket['ETag']})
+    assert response.status_code == 200
+    assert response['ETag'] != basket['ETag']
+    assert response.json()[0]['ordered_items'][0]['quantity'] == 1
+
+    client.post('/api/v1/order/', data={'contact_id': buyer_contact.id}, content_type='application/json',
+                headers=headers)
+    response = client.get('/api/v1/order/', headers={**headers, 'If-None-Match': orders['ETag']})
+    assert response.status_code == 200
+    assert response.json()[0]['status'] == 'placed'
+    assert client.get('/api/v1/order/', headers={**headers, 'If-None-Match': response['ETag']}).status_code == 304
+
+
+@pytest.mark.django_db
+def test_order_total(client, buyer_token, basket_product, buyer_contact):
+    headers = {'Authorization': buyer_token}
+    product_info = basket_product.product_info
+    client.put('/api/v1/basket/', data={'items': [{'product_info': product_info.id, 'quantity': 2}]},
+               content_type='application/json', headers=headers)
+    assert client.get('/api/v1/basket/', headers=headers).json()[0]['total_sum'] == product_info.price * 2
+
+    product_info.price += 10
+    product_info.save()
+    # Корзина выводится по текущим ценам, ту же сумму фиксирует оформление заказа
+    assert OrderItem.objects.get(id=basket_product.id).price is None
+    assert client.get('/api/v1/basket/', headers=headers).json()[0]['total_sum'] == product_info.price * 2
+    client.post('/api/v1/order/', data={'contact_id': buyer_contact.id}, content_type='application/json',
+                headers=headers)
+    order_item = OrderItem.objects.get(id=basket_product.id)
+    # При оформлении цена позиции фиксируется по текущей цене товара
+    assert (order_item.price, order_item.total_sum) == (product_info.price, product_info.price * 2)
+    assert order_item.order.total_sum == product_info.price * 2
+
+    # Изменение цены поставщиком не меняет сумму оформленного заказа
+    ProductInfo.objects.filter(id=product_info.id).update(price=product_info.price + 100)
+    order = client.get('/api/v1/order/', headers=headers).json()[0]
+    assert order['total_sum'] == product_info.price * 2
+    assert order['ordered_items'][0]['price'] == str(product_info.price)
+
+    client.delete('/api/v1/basket/', data={'items': [{'product_info': 'all'}]}, content_type='application/json',
+                  headers=headers)
+    assert Order.objects.get(id=order_item.order_id).total_sum == product_info.price * 2
+
+
+@pytest.mark.django_db
+def test_refresh_order_totals(user_buyer, price_yandex):
+    product_infos = list(price_yandex[:2])
+    # Заказ и корзина в состоянии до появления сохраненных цен и сумм
+    order = Order.objects.create(user=user_buyer, status='placed')
+    basket = Order.objects.create(user=user_buyer, status='basket')
+    OrderItem.objects.bulk_create([OrderItem(order=order, product_info=product_info, quantity=2)
+                                   for product_info in product_infos])
+    OrderItem.objects.create(order=basket, product_info=product_infos[0], quantity=1, price=1)
+    call_command('refresh_order_totals', stdout=io.StringIO())
+    order.refresh_from_db()
+    assert order.total_sum == sum(product_info.price * 2 for product_info in product_infos)
+    assert sorted(order.ordered_items.values_list('price', flat=True)) == \
+           sorted(product_info.price for product_info in product_infos)
+    assert basket.ordered_items.get().price is None
+
+
+@pytest.mark.django_db
+def test_order_values_serializer(client, buyer_token, price_yandex, price_svyaznoy, buyer_contact,
+                                 django_capture_on_commit_callbacks, django_assert_max_num_queries):
+    headers = {'Authorization': buyer_token}
+    for product_infos in (price_yandex, price_svyaznoy):
+        client.post('/api/v1/basket/', data={'items': [{'product_info': product_info.id, 'quantity': 1}
+                                                       for product_info in product_infos]},
+                    content_type='application/json', headers=headers)
+        if product_infos is price_yandex:
+            client.post('/api/v1/order/', data={'contact_id': buyer_contact.id}, content_type='application/json',
+                        headers=headers)
+    orders = Order.objects.order_by('id')
+    expected = OrderSerializer(orders.prefetch_related('ordered_items__product_info__product'), many=True).data
+    assert len(expected) == 2 and all(order['ordered_items'] for order in expected)
+    assert OrderValuesSerializer(orders, many=True).data == expected
+    # Аутентификация, ETag и два запроса .values() независимо от числа заказов и позиций
+    # (первый запрос заполняет кеш имен категорий)
+    with django_capture_on_commit_callbacks(execute=True):
+        client.get('/api/v1/order/', headers=headers)
+    for url in ('/api/v1/order/', '/api/v1/basket/'):
+        with django_assert_max_num_queries(4):
+            response = client.get(url, headers=headers)
+        assert response.json() == json.loads(json.dumps(
+            [order for order in expected if (order['status'] == 'basket') == (url == '/api/v1/basket/')]))
+
+
+@pytest.mark.django_db
+def test_product_list_etag(client, price_yandex, django_assert_num_queries):
+    response = client.get('/api/v1/products/')
+    with django_assert_num_queries(0):
+        assert client.get('/api/v1/products/', headers={'If-None-Match': response['ETag']}).status_code == 304
+    assert client.get('/api/v1/products/?page_size=1', headers={'If-None-Match': response['ETag']}).status_code == 200
+
+
 @pytest.mark.parametrize(
     "user_contact, edit_quantity_product, product_in_basket , status_code, response_text",
     [
@@ -346,3 +809,151 @@ def test_shop_order_state(client, order_items, status, token, status_code):
 # def test_shop_order(client):
 #     pass
 
+
+
+@pytest.mark.parametrize(
+    "filename, job_status, rows",
+    [
+        (lazy_fixture('price_svyaznoy_path'), 'done', 4),
+        (os.path.join(settings.BASE_DIR, 'README.md'), 'failed', 0),
+    ]
+)
+@pytest.mark.django_db
+def test_shop_price_update_status(client, shop_svyaznoy_token, filename, job_status, rows):
+    response = client.post(
+        '/api/v1/partner/update/',
+        data={'url': 'https://www.svyaznoy.ru', 'filename': filename},
+        headers={'Authorization': shop_svyaznoy_token})
+    assert response.status_code == 200
+    job_id = response.json()['job_id']
+    response = client.get(f'/api/v1/partner/update/{job_id}', headers={'Authorization': shop_svyaznoy_token})
+    assert response.status_code == 200
+    assert response.json()['status'] == job_status
+    assert response.json()['rows_processed'] == rows
+    assert bool(response.json()['errors']) == (job_status == 'failed')
+    assert response.json()['elapsed'] is not None
+
+
+@pytest.mark.django_db
+def test_product_retrieve_queries(client, price_yandex, django_capture_on_commit_callbacks,
+                                  django_assert_num_queries):
+    product_info = price_yandex.first()
+    # Первый запрос заполняет кеш имен категорий и параметров
+    with django_capture_on_commit_callbacks(execute=True):
+        client.get(f'/api/v1/products/{product_info.id}')
+    # Параметры читаются из поля parameters товара, без запросов к таблицам параметров
+    with django_assert_num_queries(1):
+        response = client.get(f'/api/v1/products/{product_info.id}')
+    assert response.status_code == 200
+    assert response.json()['product'] == {'name': product_info.product.name,
+                                          'category': product_info.product.category.name}
+    assert {item['parameter']: item['value'] for item in response.json()['product_parameters']} == \
+           dict(product_info.product_parameters.values_list('parameter__name', 'value'))
+
+
+@pytest.mark.django_db
+def test_product_parameters_json(client, price_yandex):
+    product_info = price_yandex.first()
+    product_parameter = product_info.product_parameters.select_related('parameter').first()
+    product_parameter.value = 'новое значение'
+    product_parameter.save()
+    product_parameter.parameter.name = 'Новый параметр'
+    product_parameter.parameter.save()
+    product_info.refresh_from_db()
+    assert product_info.parameters == dict(product_info.product_parameters.values_list('parameter__name', 'value'))
+    assert product_info.parameters['Новый параметр'] == 'новое значение'
+    response = client.get(f'/api/v1/products/{product_info.id}')
+    assert {'parameter': 'Новый параметр', 'value': 'новое значение'} in response.json()['product_parameters']
+
+
+def assert_uses_index(queryset, indexes=()):
+    """
+    Проверяет, что план запроса не содержит полного просмотра таблицы и использует один из индексов indexes
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        assert 'Seq Scan' not in plan, plan
+    else:
+        plan = queryset.explain()
+        assert not re.search(r'\bSCAN (?!CONSTANT)', plan), plan
+    assert not indexes or any(index in plan for index in indexes), plan
+
+
+@pytest.mark.parametrize(
+    "queryset, indexes",
+    [
+        (lambda: Order.objects.filter(user_id=1, status='basket'), ('order_user_status',)),
+        (lambda: Order.objects.filter(user_id=1).exclude(status='basket'), ()),
+        (lambda: ProductInfo.objects.filter(shop_id=1, external_id__in=[1, 2]), ()),
+        (lambda: ProductInfo.objects.filter(shop_id=1, is_active=True).values_list('id', 'external_id'), ()),
+        (lambda: OrderItem.objects.filter(order_id=1, product_info_id=1), ()),
+        (lambda: Product.objects.filter(name__in=['Смартфон'], category_id__in=[1]), ('product_name_category',)),
+        (lambda: ProductListing.objects.filter(shop_id=1).order_by('pk'), ('listing_shop',)),
+        (lambda: ProductListing.objects.filter(category_id=1).order_by('pk'), ('listing_category',)),
+    ]
+)
+@pytest.mark.django_db
+def test_query_plan_uses_indexes(queryset, indexes):
+    assert_uses_index(queryset(), indexes)
+
+
+@pytest.mark.parametrize("orjson_installed", [True, False])
+def test_fast_json_renderer(monkeypatch, orjson_installed):
+    if not orjson_installed:
+        monkeypatch.setattr(renderers, 'orjson', None)
+    dt = datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc)
+    data = {'price': Decimal('10.50'), 'dt': dt,
+            'day': datetime.date(2024, 1, 2), 'name': gettext_lazy('Товар'), 'counts': {1: 2}, 'items': [None, 1.5]}
+    expected = JSONRenderer().render(data)
+    assert json.loads(renderers.FastJSONRenderer().render(data)) == json.loads(expected)
+    response = renderers.JsonResponse(data)
+    assert response['Content-Type'] == 'application/json'
+    assert json.loads(response.content) == json.loads(DjangoJSONEncoder().encode(data))
+    assert json.loads(response.content)['dt'] == '2024-01-02T03:04:05.123Z'
+
+
+@pytest.mark.django_db
+def test_product_sparse_fields(client, price_yandex, django_capture_on_commit_callbacks):
+    product_info = price_yandex.first()
+    url = f'/api/v1/products/{product_info.id}'
+    with django_capture_on_commit_callbacks(execute=True):
+        client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url, {'fields': 'id,price,quantity'})
+    assert response.json() == {'id': product_info.id, 'price': str(product_info.price),
+                               'quantity': product_info.quantity}
+    # Невыводимые связи не соединяются в запросе
+    assert len(queries) == 1 and 'JOIN' not in queries[0]['sql']
+
+    response = client.get(url, {'fields': 'id,product.name,shop', 'expand': 'shop'})
+    assert response.json() == {'id': product_info.id, 'product': {'name': product_info.product.name},
+                               'shop': {'id': product_info.shop_id, 'name': product_info.shop.name,
+                                        'url': product_info.shop.url}}
+
+
+@pytest.mark.django_db
+def test_order_sparse_fields(client, buyer_token, basket_product, django_capture_on_commit_callbacks,
+                             django_assert_max_num_queries):
+    headers = {'Authorization': buyer_token}
+    with django_capture_on_commit_callbacks(execute=True):
+        basket = client.get('/api/v1/basket/', headers=headers).json()[0]
+    # Без позиций заказа их запрос не выполняется: аутентификация, ETag и запрос заказов
+    with django_assert_max_num_queries(3):
+        response = client.get('/api/v1/basket/', {'fields': 'id,status'}, headers=headers)
+    assert response.json() == [{'id': basket['id'], 'status': 'basket'}]
+    # Сумма корзины считается по текущим ценам товаров, поэтому требует запроса позиций
+    with django_assert_max_num_queries(4):
+        response = client.get('/api/v1/basket/', {'fields': 'id,total_sum'}, headers=headers)
+    assert response.json() == [{'id': basket['id'], 'total_sum': basket['total_sum']}]
+
+    response = client.get('/api/v1/basket/', {'fields': 'id,ordered_items.quantity,ordered_items.product_info.price'},
+                          headers=headers)
+    item = basket['ordered_items'][0]
+    assert response.json() == [{'id': basket['id'], 'ordered_items': [
+        {'quantity': item['quantity'], 'product_info': {'price': item['product_info']['price']}}]}]
+    request = Request(APIRequestFactory().get(
+        '/', {'fields': 'id,ordered_items.quantity,ordered_items.product_info.price'}))
+    assert OrderSerializer(Order.objects.filter(id=basket['id']), many=True,
+                           context={'request': request}).data == response.json()
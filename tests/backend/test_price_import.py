@@ -0,0 +1,509 @@
+import csv
+import json
+import os
+import threading
+import tracemalloc
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import yaml
+from django.conf import settings
+from django.db import connection, DatabaseError
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from backend import fetcher, tasks
+from backend.cache import NameCache, parameter_names
+from backend.feeds import read_feed, open_feed, PriceFeed
+from backend.importer import PriceImporter, PriceImportError, run_import_job
+from backend.management.commands.benchmark_price_import import generate_price, export_price
+from backend.models import Shop, Product, ProductInfo, ProductParameter, Parameter, Category, ImportJob, ProductFacet, \
+    ProductListing
+from backend.validation import validate_feed
+from backend.tasks import fetch_price_task, fetch_price_lists_task, schedule_price_imports_task
+from users.models import User
+
+
+@pytest.fixture
+def shop():
+    user = User.objects.create(email='importer@mail.com', is_verified=True, is_active=True, type='shop')
+    return Shop.objects.create(name='Импорт', user=user)
+
+
+@pytest.fixture
+def price_data():
+    with open(os.path.join(settings.BASE_DIR, 'data/shop_yandexmarket.yaml'), encoding='utf-8') as fh:
+        return yaml.load(fh, Loader=yaml.SafeLoader)
+
+
+@pytest.mark.django_db
+def test_import_price(shop, price_data):
+    importer = PriceImporter(shop)
+    importer.import_categories(price_data['categories'])
+    rows = importer.import_goods(price_data['goods'])
+    assert rows == len(price_data['goods'])
+    assert ProductInfo.objects.filter(shop=shop).count() == len(price_data['goods'])
+    assert set(Category.objects.filter(shops=shop).values_list('id', flat=True)) == \
+           {category['id'] for category in price_data['categories']}
+    item = price_data['goods'][0]
+    product_info = ProductInfo.objects.get(shop=shop, external_id=item['id'])
+    assert product_info.product.name == item['name']
+    assert dict(product_info.product_parameters.values_list('parameter__name', 'value')) == \
+           {name: str(value) for name, value in item['parameters'].items()}
+    assert product_info.parameters == {name: str(value) for name, value in item['parameters'].items()}
+
+
+@pytest.mark.django_db
+def test_import_price_query_count(shop, tmp_path, django_assert_max_num_queries):
+    path = tmp_path / 'price.yaml'
+    generate_price(path, 300)
+    with open(path, encoding='utf-8') as fh:
+        price_data = yaml.load(fh, Loader=yaml.SafeLoader)
+    importer = PriceImporter(shop, batch_size=100)
+    # Число запросов зависит от числа пакетов, а не товаров (на SQLite bulk_create делится на части по 999 значений),
+    # включая обновление ProductListing
+    with django_assert_max_num_queries(57):
+        importer.import_categories(price_data['categories'])
+        importer.import_goods(price_data['goods'])
+    assert ProductInfo.objects.filter(shop=shop).count() == 300
+    assert ProductParameter.objects.count() == 300 * 6
+    assert Parameter.objects.count() == 6
+    assert ProductFacet.objects.count() == 300 * 6
+    assert ProductListing.objects.filter(shop=shop).count() == 300
+
+
+@pytest.mark.parametrize(
+    "field, value, error",
+    [
+        ('category', 999999, 'Неизвестная категория 999999'),
+        ('price', None, 'отсутствует поле'),
+    ]
+)
+@pytest.mark.django_db
+def test_import_price_errors(shop, price_data, field, value, error):
+    if value is None:
+        del price_data['goods'][-1][field]
+    else:
+        price_data['goods'][-1][field] = value
+    importer = PriceImporter(shop)
+    importer.import_categories(price_data['categories'])
+    with pytest.raises(PriceImportError, match=error):
+        importer.import_goods(price_data['goods'])
+
+
+@pytest.mark.django_db
+def test_import_price_diff(shop, price_data):
+    importer = PriceImporter(shop)
+    importer.import_categories(price_data['categories'])
+    importer.import_goods(price_data['goods'])
+    importer.retire_missing()
+    ids = dict(ProductInfo.objects.filter(shop=shop).values_list('external_id', 'id'))
+
+    changed, removed = price_data['goods'][0], price_data['goods'].pop()
+    changed['price'] += 100
+    changed['parameters']['Цвет'] = 'белый'
+    importer = PriceImporter(shop)
+    importer.import_categories(price_data['categories'])
+    importer.import_goods(price_data['goods'])
+    importer.retire_missing()
+
+    assert (importer.inserted, importer.updated, importer.retired) == (0, 1, 1)
+    assert dict(ProductInfo.objects.filter(shop=shop).values_list('external_id', 'id')) == ids
+    product_info = ProductInfo.objects.get(shop=shop, external_id=changed['id'])
+    assert product_info.price == changed['price']
+    assert product_info.product_parameters.get(parameter__name='Цвет').value == 'белый'
+    assert product_info.facets.get(parameter__name='Цвет').value == 'белый'
+    assert product_info.parameters['Цвет'] == 'белый'
+    retired = ProductInfo.objects.get(shop=shop, external_id=removed['id'])
+    assert (retired.is_active, retired.quantity) == (False, 0)
+    assert ProductListing.objects.get(product_info=product_info).price == changed['price']
+    assert not ProductListing.objects.filter(product_info=retired).exists()
+
+
+@pytest.mark.django_db
+def test_import_price_numeric_names(shop, price_data):
+    for item in price_data['goods']:
+        item['name'], item['model'] = 2024, 3310
+        item['parameters'] = {'Год': 2024}
+    importer = PriceImporter(shop)
+    importer.import_categories(price_data['categories'])
+    importer.import_goods(price_data['goods'])
+    products = Product.objects.count()
+
+    importer = PriceImporter(shop)
+    importer.import_categories(price_data['categories'])
+    with CaptureQueriesContext(connection) as queries:
+        importer.import_goods(price_data['goods'])
+    assert (importer.inserted, importer.updated) == (0, 0)
+    assert Product.objects.count() == products
+    assert not [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+
+@pytest.mark.django_db
+def test_read_yaml_feed(price_data):
+    path = os.path.join(settings.BASE_DIR, 'data/shop_yandexmarket.yaml')
+    with open(path, encoding='utf-8') as fh:
+        feed = read_feed(fh, path)
+        assert (feed.shop, feed.categories) == (price_data['shop'], price_data['categories'])
+        assert isinstance(feed.goods, types.GeneratorType)
+        assert list(feed.goods) == price_data['goods']
+
+
+@pytest.mark.django_db
+def test_read_yaml_feed_sorted_keys(price_data, tmp_path):
+    # yaml.safe_dump по умолчанию сортирует ключи, и раздел goods оказывается раньше shop
+    path = tmp_path / 'price.yaml'
+    with open(path, 'w', encoding='utf-8') as fh:
+        yaml.safe_dump(price_data, fh, allow_unicode=True)
+    with open(path, encoding='utf-8') as fh:
+        assert fh.readline().startswith('categories:')
+        fh.seek(0)
+        feed = read_feed(fh, str(path))
+        assert (feed.shop, feed.categories) == (price_data['shop'], price_data['categories'])
+        assert list(feed.goods) == price_data['goods']
+
+    with open(path, 'w', encoding='utf-8') as fh:
+        yaml.safe_dump({'goods': price_data['goods'], 'shop': price_data['shop']}, fh, allow_unicode=True)
+    with open(path, encoding='utf-8') as fh, pytest.raises(PriceImportError, match='categories'):
+        read_feed(fh, str(path))
+
+
+@pytest.mark.django_db
+def test_read_jsonl_feed(price_data, tmp_path):
+    path = tmp_path / 'price.jsonl'
+    with open(path, 'w', encoding='utf-8') as fh:
+        fh.write(json.dumps({'shop': price_data['shop'], 'categories': price_data['categories']}) + '\n')
+        for item in price_data['goods']:
+            fh.write(json.dumps(item, ensure_ascii=False) + '\n')
+    with open(path, encoding='utf-8') as fh:
+        feed = read_feed(fh, str(path))
+        assert feed.shop == price_data['shop']
+        assert list(feed.goods) == price_data['goods']
+
+
+def test_read_yaml_feed_memory(tmp_path):
+    path = tmp_path / 'price.yaml'
+    generate_price(path, 1000)
+
+    def peak(read):
+        tracemalloc.start()
+        with open(path, encoding='utf-8') as fh:
+            read(fh)
+        result = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result
+
+    streaming = peak(lambda fh: sum(1 for _ in read_feed(fh, str(path)).goods))
+    full = peak(lambda fh: yaml.load(fh, Loader=yaml.SafeLoader))
+    assert streaming * 5 < full
+
+
+def write_parquet(path, price_data):
+    pyarrow = pytest.importorskip('pyarrow')
+    parquet = pytest.importorskip('pyarrow.parquet')
+    csv_path = path.replace('.parquet', '.csv')
+    export_price(price_data, csv_path)
+    with open(csv_path, encoding='utf-8', newline='') as fh:
+        rows = [{name: value or None for name, value in row.items()} for row in csv.DictReader(fh)]
+    parquet.write_table(pyarrow.Table.from_pylist(rows), path)
+
+
+@pytest.mark.parametrize("extension", ['csv', 'parquet'])
+@pytest.mark.django_db
+def test_import_table_feed(shop, price_data, tmp_path, extension):
+    path = str(tmp_path / f'price.{extension}')
+    if extension == 'parquet':
+        write_parquet(path, price_data)
+    else:
+        export_price(price_data, path)
+    with open_feed(path) as feed:
+        assert feed.shop == price_data['shop']
+        importer = PriceImporter(shop)
+        importer.import_categories(feed.categories)
+        importer.import_goods(feed.goods)
+    assert ProductInfo.objects.filter(shop=shop).count() == len(price_data['goods'])
+    for item in price_data['goods']:
+        product_info = ProductInfo.objects.get(shop=shop, external_id=item['id'])
+        assert (product_info.product.name, product_info.price, product_info.quantity) == \
+               (item['name'], item['price'], item['quantity'])
+        assert dict(product_info.product_parameters.values_list('parameter__name', 'value')) == \
+               {name: str(value) for name, value in item['parameters'].items()}
+
+
+class PriceHandler(BaseHTTPRequestHandler):
+    """
+    Заглушка сервера поставщика с поддержкой ETag
+    """
+    body = b''
+    etag = '"v1"'
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def price_server():
+    with open(os.path.join(settings.BASE_DIR, 'data/shop_yandexmarket.yaml'), 'rb') as fh:
+        PriceHandler.body, PriceHandler.etag, PriceHandler.requests = fh.read(), '"v1"', []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PriceHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/price.yaml'
+    server.shutdown()
+
+
+@pytest.mark.django_db
+def test_fetch_price(shop, price_server, settings, tmp_path):
+    settings.PRICE_DOWNLOAD_DIR = str(tmp_path)
+    shop.name, shop.url = 'Яндекс-Маркет', price_server
+    shop.save()
+
+    fetch_price_lists_task()
+    assert ProductInfo.objects.filter(shop=shop).count() == 4
+    assert ImportJob.objects.get().status == 'done'
+    assert Shop.objects.get(id=shop.id).price_etag == '"v1"'
+    # Прайс не изменился - сервер отвечает 304
+    assert fetch_price_task(shop.id) is None
+    assert PriceHandler.requests == [None, '"v1"']
+    # Изменился ETag, но не содержимое - загрузка не выполняется
+    PriceHandler.etag = '"v2"'
+    fetch_price_lists_task()
+    assert ImportJob.objects.count() == 1
+    assert Shop.objects.get(id=shop.id).price_etag == '"v2"'
+    assert os.listdir(tmp_path) == [os.path.basename(ImportJob.objects.get().filename)]
+    # После загрузки нового прайса предыдущий файл удаляется, файл неуспешной загрузки - тоже
+    PriceHandler.body, PriceHandler.etag = PriceHandler.body + b'\n', '"v3"'
+    fetch_price_lists_task()
+    job = ImportJob.objects.latest('id')
+    assert job.status == 'done'
+    assert os.listdir(tmp_path) == [os.path.basename(job.filename)]
+    PriceHandler.body, PriceHandler.etag = b'goods: [', '"v4"'
+    fetch_price_lists_task()
+    assert ImportJob.objects.latest('id').status == 'failed'
+    assert os.listdir(tmp_path) == [os.path.basename(job.filename)]
+
+
+@pytest.mark.django_db
+def test_fetch_price_error(shop, price_server, settings, tmp_path, monkeypatch):
+    settings.PRICE_DOWNLOAD_DIR = str(tmp_path)
+    shop.url = price_server
+    shop.save()
+
+    def iter_content(self, chunk_size):
+        yield b'goods:'
+        raise requests.exceptions.ChunkedEncodingError('Соединение прервано')
+
+    # Оборванная загрузка не оставляет файла и записывается в загрузку со статусом failed
+    with monkeypatch.context() as patch:
+        patch.setattr(requests.Response, 'iter_content', iter_content)
+        assert fetch_price_task(shop.id) is None
+    assert os.listdir(tmp_path) == []
+    job = ImportJob.objects.get()
+    assert (job.status, job.errors[0]['error']) == ('failed', 'Соединение прервано')
+    # Каждая загрузка скачивается в отдельный файл
+    first = ImportJob.objects.get(id=fetch_price_task(shop.id))
+    second = ImportJob.objects.get(id=fetch_price_task(shop.id))
+    assert first.filename != second.filename
+    assert first.filename.endswith('.yaml') and os.path.exists(first.filename)
+
+
+@pytest.mark.django_db
+def test_fetch_price_lists_error(shop, price_server, settings, tmp_path, monkeypatch):
+    settings.PRICE_DOWNLOAD_DIR = str(tmp_path)
+    shop.name, shop.url = 'Яндекс-Маркет', price_server
+    shop.save()
+    user = User.objects.create(email='broken@mail.com', is_verified=True, is_active=True, type='shop')
+    broken = Shop.objects.create(name='Без доступа', user=user, url=price_server)
+
+    def fetch_price(shop):
+        if shop.id == broken.id:
+            raise PermissionError('Нет доступа к каталогу прайсов')
+        return fetcher.fetch_price(shop)
+
+    # Ошибка одного магазина не останавливает загрузку прайсов остальных
+    monkeypatch.setattr(tasks, 'fetch_price', fetch_price)
+    fetch_price_lists_task()
+    assert ProductInfo.objects.filter(shop=shop).count() == 4
+    assert dict(ImportJob.objects.values_list('user_id', 'status')) == {shop.user_id: 'done', user.id: 'failed'}
+    assert fetch_price_task(0) is None
+
+
+@pytest.mark.django_db
+def test_parameter_name_cache(django_capture_on_commit_callbacks, django_assert_num_queries):
+    with django_capture_on_commit_callbacks(execute=True):
+        ids = parameter_names.get_ids({'Цвет', 'Вес (г)'}, create=True)
+    assert Parameter.objects.filter(name__in=ids).count() == 2
+    with django_assert_num_queries(0):
+        assert parameter_names.get_ids({'Цвет'}) == {'Цвет': ids['Цвет']}
+        assert parameter_names.get_name(ids['Вес (г)']) == 'Вес (г)'
+    parameter = Parameter.objects.get(id=ids['Цвет'])
+    parameter.name = 'Цвет корпуса'
+    parameter.save()
+    assert parameter_names.get_name(ids['Цвет']) == 'Цвет корпуса'
+
+
+@pytest.mark.django_db
+def test_name_cache_cross_process(settings, django_capture_on_commit_callbacks):
+    # Кеш другого процесса: отдельный экземпляр NameCache с общим кешем Django
+    other = NameCache(Parameter)
+    with django_capture_on_commit_callbacks(execute=True):
+        parameter = Parameter.objects.create(name='Цвет')
+        assert other.get_name(parameter.id) == 'Цвет'
+    settings.NAME_CACHE_CHECK_INTERVAL = 60
+    with django_capture_on_commit_callbacks(execute=True):
+        parameter.name = 'Цвет корпуса'
+        parameter.save()
+    # Версия сверяется не чаще NAME_CACHE_CHECK_INTERVAL
+    assert other.get_name(parameter.id) == 'Цвет'
+    settings.NAME_CACHE_CHECK_INTERVAL = 0
+    assert other.get_name(parameter.id) == 'Цвет корпуса'
+
+
+@pytest.mark.django_db
+def test_import_job_rollback(shop, price_data, tmp_path, settings, monkeypatch):
+    settings.PRICE_IMPORT_BATCH_SIZE = 2
+    shop.name = price_data['shop']
+    shop.save()
+    path = tmp_path / 'price.yaml'
+    with open(path, 'w', encoding='utf-8') as fh:
+        yaml.safe_dump(price_data, fh, allow_unicode=True, sort_keys=False)
+    assert run_import_job(ImportJob.objects.create(user=shop.user, filename=str(path))).status == 'done'
+    prices = dict(ProductInfo.objects.filter(shop=shop).values_list('external_id', 'price'))
+
+    price_data['goods'][0]['price'] += 100
+    with open(path, 'w', encoding='utf-8') as fh:
+        yaml.safe_dump(price_data, fh, allow_unicode=True, sort_keys=False)
+    # Ошибка базы данных во втором пакете, которую не находит предварительная проверка
+    sync_parameters = PriceImporter._sync_parameters
+    calls = []
+
+    def failing_sync(*args):
+        calls.append(1)
+        if len(calls) > 1:
+            raise PriceImportError('Ошибка записи параметров')
+        return sync_parameters(*args)
+
+    monkeypatch.setattr(PriceImporter, '_sync_parameters', staticmethod(failing_sync))
+    job = run_import_job(ImportJob.objects.create(user=shop.user, filename=str(path)))
+    assert job.status == 'failed'
+    assert [error['error'] for error in job.errors] == ['Ошибка записи параметров. Товары 3-4']
+    assert job.shop == shop
+    assert dict(ProductInfo.objects.filter(shop=shop).values_list('external_id', 'price')) == prices
+
+    # Непредвиденная ошибка помечает загрузку неуспешной и передается дальше
+    def broken_sync(*args):
+        raise DatabaseError('value too long')
+
+    monkeypatch.setattr(PriceImporter, '_sync_parameters', staticmethod(broken_sync))
+    job = ImportJob.objects.create(user=shop.user, filename=str(path))
+    with pytest.raises(DatabaseError):
+        run_import_job(job)
+    job.refresh_from_db()
+    assert (job.status, job.errors[0]['error']) == ('failed', 'value too long')
+    assert job.finished_at is not None
+    assert dict(ProductInfo.objects.filter(shop=shop).values_list('external_id', 'price')) == prices
+
+
+@pytest.mark.django_db
+def test_schedule_price_imports(price_data, tmp_path):
+    job_ids = []
+    for number in range(3):
+        user = User.objects.create(email=f'shop{number}@mail.com', is_verified=True, is_active=True, type='shop')
+        path = tmp_path / f'price{number}.yaml'
+        with open(path, 'w', encoding='utf-8') as fh:
+            yaml.safe_dump({**price_data, 'shop': f'Магазин {number}'}, fh, allow_unicode=True, sort_keys=False)
+        job_ids.append(ImportJob.objects.create(user=user, filename=str(path)).id)
+    # Прайс с ошибками не создает категорий и параметров
+    user = User.objects.create(email='invalid@mail.com', is_verified=True, is_active=True, type='shop')
+    path = tmp_path / 'invalid.yaml'
+    goods = [{**price_data['goods'][0], 'price': 0, 'parameters': {'Только в прайсе с ошибками': 1}}]
+    with open(path, 'w', encoding='utf-8') as fh:
+        yaml.safe_dump({'shop': 'Ошибки', 'categories': [{'id': 555, 'name': 'Только в прайсе с ошибками'}],
+                        'goods': goods}, fh, allow_unicode=True)
+    job_ids.append(ImportJob.objects.create(user=user, filename=str(path)).id)
+    assert schedule_price_imports_task(job_ids) == job_ids
+    assert list(ImportJob.objects.filter(id__in=job_ids).order_by('id').values_list('status', flat=True)) == \
+           ['done'] * 3 + ['failed']
+    assert ProductInfo.objects.count() == 3 * len(price_data['goods'])
+    assert Parameter.objects.count() == len({name for item in price_data['goods'] for name in item['parameters']})
+    assert not Category.objects.filter(id=555).exists()
+
+
+@pytest.mark.django_db
+def test_validate_feed(price_data):
+    Category.objects.create(id=777, name='Существующая категория')
+    goods = price_data['goods']
+    goods.append({**goods[0], 'id': 1, 'category': 777})
+    goods[0]['price'] = 0
+    goods[1]['id'] = goods[0]['id']
+    del goods[2]['name']
+    goods[2]['quantity'] = 'много'
+    goods[3]['category'] = 999999
+    errors = validate_feed(PriceFeed(price_data['shop'], price_data['categories'], iter(goods)))
+    assert [(error['row'], error['field']) for error in errors] == \
+           [(1, 'price'), (2, 'id'), (3, 'name'), (3, 'quantity'), (4, 'category')]
+    assert errors[1]['id'] == goods[0]['id']
+    assert validate_feed(PriceFeed('', [{'id': 'x'}], iter([])), max_errors=1) == \
+           [{'row': None, 'id': None, 'field': 'shop', 'error': 'Не указано название магазина или указано неверно'}]
+    # Названия магазина и категорий не длиннее столбцов в базе
+    categories = [{**price_data['categories'][0], 'name': 'К' * 129}]
+    errors = validate_feed(PriceFeed('М' * 129, categories, iter([])))
+    assert [(error['id'], error['field']) for error in errors] == [(None, 'shop'), (categories[0]['id'], 'categories')]
+
+
+@pytest.mark.django_db
+def test_validate_feed_matches_import(shop, price_data):
+    # Категория из базы, отсутствующая в разделе categories, принимается и проверкой, и загрузкой
+    Category.objects.create(id=777, name='Существующая категория')
+    price_data['goods'][0]['category'] = 777
+    feed = PriceFeed(price_data['shop'], price_data['categories'], iter(price_data['goods']))
+    assert validate_feed(feed) == []
+    importer = PriceImporter(shop)
+    importer.import_categories(price_data['categories'])
+    importer.import_goods(price_data['goods'])
+    assert ProductInfo.objects.get(shop=shop, external_id=price_data['goods'][0]['id']).product.category_id == 777
+    assert Category.objects.filter(id=777, shops=shop).exists()
+
+    # Конфликт ИД и названия категории, который отклоняет загрузка, попадает в отчет проверки
+    category = price_data['categories'][0]
+    Category.objects.filter(id=category['id']).update(name='Другое название')
+    feed = PriceFeed(price_data['shop'], price_data['categories'], iter(price_data['goods']))
+    assert [(error['id'], error['field']) for error in validate_feed(feed)] == [(category['id'], 'categories')]
+    with pytest.raises(PriceImportError, match='Категория'):
+        PriceImporter(shop).import_categories(price_data['categories'])
+
+
+@pytest.mark.django_db
+def test_import_job_validation_report(shop, price_data, tmp_path):
+    price_data['goods'][0]['price_rrc'] = -1
+    price_data['goods'][-1]['category'] = 999999
+    path = str(tmp_path / 'price.jsonl')
+    export_price(price_data, path)
+    job = run_import_job(ImportJob.objects.create(user=shop.user, filename=path))
+    assert job.status == 'failed'
+    assert [(error['row'], error['field']) for error in job.errors] == [(1, 'price_rrc'), (4, 'category')]
+    assert not ProductInfo.objects.exists()
+
+    client = APIClient()
+    client.force_authenticate(shop.user)
+    response = client.get(f'/api/v1/partner/update/{job.id}/report')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/csv')
+    rows = list(csv.DictReader(response.content.decode('utf-8').splitlines()))
+    assert [(row['row'], row['id'], row['field']) for row in rows] == \
+           [('1', str(price_data['goods'][0]['id']), 'price_rrc'), ('4', str(price_data['goods'][-1]['id']), 'category')]
@@ -0,0 +1,38 @@
+import pytest
+from django.core.cache import cache
+
+from backend.cache import parameter_names, category_names
+from backend.search import product_index
+from orders.celery import celery_app
+
+
+@pytest.fixture(autouse=True)
+def celery_eager():
+    """
+    Задачи Celery выполняются синхронно, без брокера
+    """
+    celery_app.conf.task_always_eager = True
+    celery_app.conf.task_eager_propagates = True
+    yield
+    celery_app.conf.task_always_eager = False
+    celery_app.conf.task_eager_propagates = False
+
+
+@pytest.fixture(autouse=True)
+def name_caches():
+    """
+    Кеш имен справочников и поисковый индекс в памяти не переживают откат тестовой транзакции
+    """
+    yield
+    parameter_names.invalidate()
+    category_names.invalidate()
+    product_index.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def django_cache():
+    """
+    Кеш в памяти процесса (ответы каталога, ход загрузки) очищается после каждого теста
+    """
+    yield
+    cache.clear()
@@ -123,6 +123,7 @@ class Contact(models.Model):
     building = models.CharField(max_length=15, verbose_name='Строение', blank=True)
     apartment = models.CharField(max_length=15, verbose_name='Квартира', blank=True)
     phone = models.CharField(max_length=20, verbose_name='Телефон')
+    updated_at = models.DateTimeField(verbose_name='Дата изменения', auto_now=True)
 
     class Meta:
         verbose_name = 'Контакт пользователя'
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework.permissions import BasePermission
 
 
@@ -6,6 +7,16 @@ class IsActivated(BasePermission):
         return bool(request.user and request.user.is_verified)
 
 
+class IsActivatedOrAnonymousBasket(BasePermission):
+    """
+    Корзина доступна подтвержденным пользователям, а при хранении корзин в Redis - и анонимным
+    """
+    def has_permission(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return bool(request.user.is_verified)
+        return settings.BASKET_BACKEND == 'redis'
+
+
 class IsShop(BasePermission):
     message = 'Вы должы быть Поставщиком!'
     def has_permission(self, request, view):
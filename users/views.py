@@ -1,7 +1,8 @@
 from smtplib import SMTPRecipientsRefused, SMTPDataError
 from rest_framework import serializers
 
-from django.http import JsonResponse
+from backend.basket import merge_anonymous_basket
+from backend.renderers import JsonResponse
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema, extend_schema_view, inline_serializer
 
@@ -146,6 +147,9 @@ class LoginAccountView(APIView):
             user.last_login = timezone.now()
             user.save()
             token, _ = Token.objects.get_or_create(user=user)
+            # Вход по токену не вызывает login(), поэтому сигнал user_logged_in не отправляется:
+            # корзина, собранная до входа, переносится здесь
+            merge_anonymous_basket(request, user)
             return JsonResponse({'Status': True, 'Response': {'email': user.email, 'token': token.key}}, status=status.HTTP_200_OK)
         else:
             return serializer_error(serializer)